@@ -0,0 +1,322 @@
+########################
+# Arena: an MCTS engine against the greedy player, or against another MCTS engine, over many games spread
+# over a process pool. Every finished game is appended to a JSONL file as one record (layout, colours,
+# final score, moves and time per move) and the running score is printed with its 95% confidence
+# interval. The file is also the state of the run: started again on the same file, the arena only plays
+# the games that are not in it yet.
+#
+# Game i is played with the seed seed + i, whichever worker gets it, so a resumed run plays the same games
+# as an uninterrupted one. A run is only resumed with the options, layout and seed it was started with.
+# The engine under test plays X in the even games and O in the odd ones.
+#
+# With an SPRT the run stops as soon as the games played decide between H0 (the engine is elo0 Elo
+# stronger than its opponent) and H1 (elo1 Elo stronger), with error rates alpha and beta.
+########################
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+from math import log, sqrt
+from time import perf_counter
+
+import numpy as np
+
+import greedy_base as gb
+from bitboard import BitBoard, otherTile
+from endgame import ENDGAME_EMPTIES
+from mcts import C_PARAM, EPSILON, MonteCarloTreeSearchNode
+from time_manager import TimeManager
+from transposition import TranspositionTable
+
+LAYOUT = {'sizeX': 8, 'sizeY': 8, 'stones': [[1, 6], [6, 6]]}  # the layout of server_reversi
+
+# MCTS settings of an engine, with their defaults (the arguments of client_program_mcts, plus the
+# exploration constant and the rollout epsilon)
+OPTIONS = {'time_limit': .1, 'max_time': None, 'penalty_budget': 0, 'tt_size': 1 << 16,
+           'endgame_empties': ENDGAME_EMPTIES, 'rave': 0, 'widening': 0, 'bias': 0, 'c_param': C_PARAM,
+           'epsilon': EPSILON}
+
+
+def randomLayout(rng):
+    # Two stones anywhere on an 8x8 board, as PLAY_GAME_AUTO does.
+    return {'sizeX': 8, 'sizeY': 8, 'stones': [[rng.randint(0, 7), rng.randint(0, 7)] for _ in range(2)]}
+
+
+class Engine:
+    # One side of a game: MCTS with 'options' (a full OPTIONS dict), or the greedy player for None. The
+    # MCTS engine keeps its tree from move to move, like client_mcts.
+    def __init__(self, options, tile):
+        self.options = options
+        self.tile = tile
+        self.root = None
+        self.times = []
+        if options is not None:
+            self.manager = TimeManager(options['max_time'], penalty_budget=options['penalty_budget']) \
+                if options['max_time'] else None
+            self.table = TranspositionTable(options['tt_size']) if options['tt_size'] else None
+
+    def move(self, board, passes):
+        # The move ([x, y], or None to pass) of the engine's tile on 'board'.
+        t = perf_counter()
+        if self.options is None:
+            move = gb.chooseGreedyMove(board, self.tile)
+        else:
+            options = self.options
+            if self.root is None:
+                self.root = MonteCarloTreeSearchNode(board.copy(), True, None, None, self.tile, table=self.table,
+                                                     passes=passes, rave=options['rave'],
+                                                     widening=options['widening'], bias=options['bias'],
+                                                     c_param=options['c_param'], epsilon=options['epsilon'])
+            clock = self.manager.startMove(self.root.state, self.tile) if self.manager is not None else None
+            action = self.root.best_action(time_limit=options['time_limit'], clock=clock,
+                                           endgame_empties=options['endgame_empties'])
+            if clock is not None:
+                self.manager.finish(clock)
+            self.root = None if action == 'pass' else action
+            move = None if action == 'pass' else list(action.parent_action)
+        self.times.append(round(perf_counter() - t, 4))
+        return move
+
+    def reply(self, board, move):
+        # The other side played 'move' ([x, y] or None), which gives 'board': continue from its subtree if
+        # the search has it.
+        if self.root is not None:
+            self.root = self.root.descendant(['pass' if move is None else tuple(move)])
+            if self.root is not None:
+                self.root.make_root(board.copy())
+
+
+def playGame(args):
+    # Runs in a worker: plays game 'game' and returns its record. 'opponent' is the options of the
+    # opposing MCTS engine, or None for the greedy player.
+    game, seed, layout, options, opponent = args
+    random.seed(seed)
+    np.random.seed(seed % 2**32)
+    if layout is None:
+        layout = randomLayout(random.Random(seed))
+
+    board = BitBoard(layout['sizeX'], layout['sizeY'], layout['stones'])
+    engineTile = 'X' if game % 2 == 0 else 'O'
+    engines = {engineTile: Engine(options, engineTile),
+               otherTile(engineTile): Engine(opponent, otherTile(engineTile))}
+    tile, passes = 'X', 0
+    moves = []
+    while passes < 2:
+        move = engines[tile].move(board, passes)
+        if move is None:
+            passes += 1
+            moves.append([tile, 'pass'])
+        else:
+            passes = 0
+            board.makeMove(tile, move[0], move[1])
+            moves.append([tile] + move)
+        tile = otherTile(tile)
+        engines[tile].reply(board, move)
+
+    score = board.getScore()
+    mine, theirs = score[engineTile], score[otherTile(engineTile)]
+    return {'game': game, 'seed': seed, 'layout': layout, 'engine': engineTile, 'opponent': otherTile(engineTile),
+            'score': {'X': score['X'], 'O': score['O']},
+            'result': 'win' if mine > theirs else ('loss' if mine < theirs else 'draw'),
+            'moves': moves, 'times': engines[engineTile].times, 'opponentTimes': engines[otherTile(engineTile)].times,
+            'options': options, 'opponentOptions': opponent}
+
+
+def confidenceInterval(wins, losses, draws, z=1.96):
+    # Mean score per game (a draw is half a point) and the half-width of its confidence interval
+    # (normal approximation, 95% by default).
+    games = wins + losses + draws
+    if not games:
+        return 0., 1.
+    score = (wins + draws / 2) / games
+    variance = (wins + draws / 4) / games - score * score
+    return score, z * sqrt(max(variance, 0.) / games)
+
+
+class Tally:
+    def __init__(self):
+        self.results = {'win': 0, 'loss': 0, 'draw': 0}
+
+    def add(self, record):
+        self.results[record['result']] += 1
+
+    def games(self):
+        return sum(self.results.values())
+
+    def summary(self):
+        wins, losses, draws = self.results['win'], self.results['loss'], self.results['draw']
+        score, margin = confidenceInterval(wins, losses, draws)
+        return f'+{wins} -{losses} ={draws}, score {100 * score:.1f}% +- {100 * margin:.1f}'
+
+
+def loadRecords(path):
+    # Records already in the file. A record cut short by an interruption is dropped from the file, so
+    # that the game is played again and the next record starts on its own line.
+    if not os.path.exists(path):
+        return []
+    with open(path, 'rb') as f:
+        data = f.read()
+    end = data.rfind(b'\n') + 1
+    if end < len(data):
+        with open(path, 'r+b') as f:
+            f.truncate(end)
+    return [json.loads(line) for line in data[:end].decode().splitlines() if line.strip()]
+
+
+def eloToScore(elo):
+    # Expected score per game of a player 'elo' Elo stronger than its opponent (logistic model).
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+class SPRT:
+    # Sequential probability ratio test of H0 (the engine is elo0 Elo stronger than its opponent) against
+    # H1 (elo1 Elo stronger). Each hypothesis is the most likely win/draw/loss distribution with the
+    # expected score of its Elo (generalised SPRT); the test stops once the log-likelihood ratio of the
+    # results leaves [log(beta / (1 - alpha)), log((1 - beta) / alpha)].
+    RESULTS = (('win', 1.), ('draw', .5), ('loss', 0.))
+
+    def __init__(self, elo0=0., elo1=10., alpha=.05, beta=.05):
+        self.elo0, self.elo1 = elo0, elo1
+        self.score0, self.score1 = eloToScore(elo0), eloToScore(elo1)
+        self.lower = log(beta / (1 - alpha))
+        self.upper = log((1 - beta) / alpha)
+
+    @staticmethod
+    def _likeliest(counts, score):
+        # Most likely probabilities of (win, draw, loss) given 'counts' and the expected 'score': the
+        # maximum under that constraint is p_i = n_i / (N (1 + lam (a_i - score))), a_i the score of the
+        # result, with lam found by bisection. A small count is added to every result so that a result
+        # not seen yet keeps some probability.
+        counts = [c + 1e-3 for c in counts]
+        total = sum(counts)
+        shifts = [a - score for _, a in SPRT.RESULTS]
+        low, high = -1 / max(shifts) + 1e-9, -1 / min(shifts) - 1e-9
+        for _ in range(100):
+            lam = (low + high) / 2
+            if sum(c * d / (1 + lam * d) for c, d in zip(counts, shifts)) > 0:
+                low = lam
+            else:
+                high = lam
+        return [c / (total * (1 + lam * d)) for c, d in zip(counts, shifts)]
+
+    def llr(self, results):
+        # Log-likelihood ratio of H1 against H0 for a {'win': n, 'draw': n, 'loss': n} tally.
+        counts = [results[name] for name, _ in self.RESULTS]
+        p0 = self._likeliest(counts, self.score0)
+        p1 = self._likeliest(counts, self.score1)
+        return sum(c * log(b / a) for c, a, b in zip(counts, p0, p1) if c)
+
+    def decide(self, results):
+        # 'H0', 'H1', or None while the results do not decide yet.
+        llr = self.llr(results)
+        return 'H1' if llr >= self.upper else ('H0' if llr <= self.lower else None)
+
+    def summary(self, results):
+        return f'LLR {self.llr(results):.2f} [{self.lower:.2f}, {self.upper:.2f}]'
+
+
+def runArena(path, games=1000, workers=None, seed=0, layout=LAYOUT, opponent=None, sprt=None, **options):
+    # Plays the games of 0 .. games-1 that are not in 'path' yet on 'workers' processes (all the CPUs by
+    # default) and appends their records to it. layout=None draws a random layout for every game.
+    # 'options' are the settings of the engine under test (see OPTIONS); 'opponent' those of an MCTS
+    # opponent, or None for the greedy player. With an SPRT, the run stops as soon as it decides (the
+    # games still being played are dropped). Returns the Tally and the SPRT decision (or None).
+    records = loadRecords(path)
+    settings = dict(OPTIONS, **options)
+    opponent = dict(OPTIONS, **opponent) if opponent is not None else None
+    if records and (records[0]['options'], records[0]['opponentOptions']) != (settings, opponent):
+        raise ValueError(f'{path} was played with other settings: {records[0]["options"]} '
+                         f'against {records[0]["opponentOptions"] or "greedy"}')
+    tally = Tally()
+    done = set()
+    for record in records:
+        # the layout and seed of every game must be the ones this run would use, or the file would mix
+        # games of different runs
+        game = record['game']
+        expected = layout if layout is not None else randomLayout(random.Random(seed + game))
+        if record['seed'] != seed + game or json.loads(json.dumps(expected)) != record['layout']:
+            raise ValueError(f'{path} was played with another layout or seed: game {game} has seed '
+                             f'{record["seed"]} and layout {record["layout"]}, this run would use seed '
+                             f'{seed + game} and layout {expected}')
+        tally.add(record)
+        done.add(game)
+    decision = sprt.decide(tally.results) if sprt is not None else None
+    if records:
+        print(f'{path}: resuming after {len(done)} games ({tally.summary()})')
+    jobs = [(game, seed + game, layout, settings, opponent) for game in range(games) if game not in done]
+    if not jobs or decision is not None:
+        return tally, decision
+    workers = workers or multiprocessing.cpu_count()
+    t = perf_counter()
+    with open(path, 'a') as out, multiprocessing.Pool(workers) as pool:
+        for played, record in enumerate(pool.imap_unordered(playGame, jobs), 1):
+            out.write(json.dumps(record) + '\n')
+            out.flush()
+            tally.add(record)
+            test = f', {sprt.summary(tally.results)}' if sprt is not None else ''
+            print(f'game {record["game"]} ({record["result"]}): {tally.games()}/{games} games, {tally.summary()}'
+                  f'{test}, {(perf_counter() - t) / played:.1f}s per game')
+            if sprt is not None:
+                decision = sprt.decide(tally.results)
+                if decision is not None:
+                    break
+    return tally, decision
+
+
+def _engineOptions(parser, prefix='', help=''):
+    # The command line options of an engine's settings (see OPTIONS), with an optional prefix.
+    group = parser.add_argument_group(help)
+    group.add_argument(f'--{prefix}time-limit', type=float, default=OPTIONS['time_limit'], help='search time per move')
+    group.add_argument(f'--{prefix}max-time', type=float, default=None, metavar='SECONDS',
+                       help='let the time manager budget each move, up to SECONDS when it matters')
+    group.add_argument(f'--{prefix}penalty-budget', type=int, default=0,
+                       help='penalty points per game the time manager may spend on unsettled positions')
+    group.add_argument(f'--{prefix}tt-size', type=int, default=OPTIONS['tt_size'],
+                       help='transposition table entries per game (0 turns it off)')
+    group.add_argument(f'--{prefix}endgame-empties', type=int, default=ENDGAME_EMPTIES,
+                       help='solve the position exactly from this many empty squares (0 turns it off)')
+    group.add_argument(f'--{prefix}rave', type=float, default=0, help='RAVE equivalence parameter (0 turns RAVE off)')
+    group.add_argument(f'--{prefix}widening', type=float, default=0, help='progressive widening (0 turns it off)')
+    group.add_argument(f'--{prefix}bias', type=float, default=0, help='progressive bias (0 turns it off)')
+    group.add_argument(f'--{prefix}c-param', type=float, default=C_PARAM, help='exploration constant of the selection')
+    group.add_argument(f'--{prefix}epsilon', type=float, default=EPSILON, help='random move probability in the rollouts')
+
+
+def _parsedOptions(args, prefix=''):
+    return {name: getattr(args, prefix + name) for name in OPTIONS}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='MCTS against the greedy player or another MCTS, on a process pool')
+    parser.add_argument('path', help='JSONL file of the results; an existing file is resumed')
+    parser.add_argument('--games', type=int, default=1000, help='number of games (the most, with --sprt)')
+    parser.add_argument('--workers', type=int, default=None, help='processes (default: one per CPU)')
+    parser.add_argument('--seed', type=int, default=0, help='game i is played with seed SEED + i')
+    parser.add_argument('--random-stones', action='store_true',
+                        help='two random stones in every game instead of the server layout')
+    parser.add_argument('--opponent', choices=['greedy', 'mcts'], default='greedy',
+                        help='the greedy player, or an MCTS set with the --opp-* options')
+    parser.add_argument('--sprt', type=float, nargs=2, metavar=('ELO0', 'ELO1'),
+                        help='stop as soon as an SPRT decides between H0: ELO0 and H1: ELO1 (Elo of the engine '
+                             'over its opponent)')
+    parser.add_argument('--alpha', type=float, default=.05, help='SPRT false positive rate')
+    parser.add_argument('--beta', type=float, default=.05, help='SPRT false negative rate')
+    _engineOptions(parser, help='engine under test')
+    _engineOptions(parser, 'opp-', help='MCTS opponent (with --opponent mcts)')
+    args = parser.parse_args()
+    sprt = SPRT(args.sprt[0], args.sprt[1], args.alpha, args.beta) if args.sprt else None
+    try:
+        tally, decision = runArena(args.path, args.games, args.workers, args.seed,
+                                   None if args.random_stones else LAYOUT,
+                                   _parsedOptions(args, 'opp_') if args.opponent == 'mcts' else None, sprt,
+                                   **_parsedOptions(args))
+    except KeyboardInterrupt:
+        print(f'\nInterrupted: run again with {args.path} to resume')
+    else:
+        print(f'Final: {tally.summary()}')
+        if sprt is not None:
+            print(f'SPRT ({sprt.elo0:g}, {sprt.elo1:g}): ' + {'H0': f'H0 accepted ({sprt.elo0:g} Elo)',
+                                                            'H1': f'H1 accepted ({sprt.elo1:g} Elo)',
+                                                            None: 'no decision'}[decision])
@@ -0,0 +1,132 @@
+########################
+# Batch playouts with NumPy: K independent games are advanced together as arrays of shape (K, X, Y).
+# Legal moves and flips of every game are found with shifted-array operations, and the moves are picked
+# with the same epsilon-greedy policy as greedy_base.chooseGreedyMove (corner first, then most flips).
+########################
+
+import numpy as np
+
+from bitboard import BitBoard
+from geometry import DIRECTIONS
+
+# cell values: the side to move of each game is +1 (X) or -1 (O), so 'own' is simply board == turn
+X, O, EMPTY, STONE = 1, -1, 0, 2
+TILE_VALUE = {'X': X, 'O': O}
+
+
+def boardToArray(board):
+    # Converts a BitBoard or a list-of-lists board to an int8 array of shape (X, Y).
+    if isinstance(board, BitBoard):
+        board = board.toBoard()
+    cells = np.array(board)
+    return ((cells == 'X') * X + (cells == 'O') * O + (cells == '*') * STONE).astype(np.int8)
+
+
+def padded(a):
+    # Surrounds the (X, Y, K) boolean array with a False margin as wide as the board, so that any
+    # line walk can be read as a slice (a view) of the padded array instead of a shifted copy.
+    margin = max(a.shape[0], a.shape[1])
+    return np.pad(a, ((margin, margin), (margin, margin), (0, 0))), margin
+
+
+def flipCounts(boards, turn):
+    # Number of discs each move of the side to move would flip in each direction, as an int
+    # (8, K, X, Y) array following DIRECTIONS. The legal moves are the squares whose sum over the
+    # directions is positive.
+    # The scan itself runs on (X, Y, K) copies: with the games on the last axis every slice below
+    # is contiguous, which is about 2.5x faster than slicing the (K, X, Y) arrays directly.
+    sizeX, sizeY = boards.shape[1], boards.shape[2]
+    cells = np.ascontiguousarray(boards.transpose(1, 2, 0))
+    own, margin = padded(cells == turn)
+    opp, _ = padded(cells == -turn)
+    empty = cells == EMPTY
+    counts = np.zeros((len(DIRECTIONS), sizeX, sizeY, len(boards)), dtype=np.int16)
+
+    def view(a, dx, dy, k):
+        # view(a, dx, dy, k)[x, y] == a[x + k*dx, y + k*dy] (False outside of the board)
+        return a[margin + k*dx:margin + k*dx + sizeX, margin + k*dy:margin + k*dy + sizeY]
+
+    for d, (dx, dy) in enumerate(DIRECTIONS):
+        # looking along (dx, dy), an empty square flips the run of opponent discs closed by ours
+        run = view(opp, dx, dy, 1) & empty
+        k = 2
+        while k <= margin and run.any():
+            counts[d][run & view(own, dx, dy, k)] = k - 1
+            run &= view(opp, dx, dy, k)
+            k += 1
+    return counts.transpose(0, 3, 1, 2)
+
+
+def legalMoves(boards, turn):
+    # Boolean (K, X, Y) mask of the legal moves of the side to move in every game.
+    return flipCounts(boards, turn).sum(axis=0) > 0
+
+
+def playMoves(boards, turn, games, xs, ys, counts):
+    # Plays, for each game index in 'games', the move (xs, ys) that flips counts[d] discs along each
+    # direction d, updating 'boards' in place.
+    boards[games, xs, ys] = turn
+    for d, (dx, dy) in enumerate(DIRECTIONS):
+        length = counts[d]
+        for k in range(1, int(length.max(initial=0)) + 1):
+            sel = length >= k
+            boards[games[sel], xs[sel] + k*dx, ys[sel] + k*dy] = turn[sel]
+
+
+def chooseMoves(total, epsilon, rng):
+    # Epsilon-greedy choice for every game, given its (K, X, Y) flip totals: with probability epsilon a
+    # uniform legal move, otherwise a corner if there is one, else the move flipping the most discs.
+    # Ties are broken at random. Returns the flat index of the chosen square of each game.
+    k, sizeX, sizeY = total.shape
+    noise = rng.random(total.shape)
+    greedy = total + noise
+    for x, y in ((0, 0), (sizeX-1, 0), (0, sizeY-1), (sizeX-1, sizeY-1)):
+        greedy[:, x, y] += sizeX * sizeY
+    explore = rng.random(k) < epsilon
+    scores = np.where(explore[:, None, None], noise, greedy)
+    scores[total == 0] = -1
+    return scores.reshape(k, -1).argmax(axis=1)
+
+
+def batchRollout(board, tile, toMove, k, epsilon=.1, passes=0, rng=None, lengths=False):
+    # Plays k games out from 'board' with 'toMove' to play and returns the results from the point of view
+    # of 'tile': an int8 vector of 1 (win), 0 (draw) and -1 (loss). With epsilon=1 the moves are uniform.
+    # With lengths, also returns the number of moves (passes excluded) played in each game.
+    rng = np.random.default_rng() if rng is None else rng
+    boards = np.repeat(boardToArray(board)[None], k, axis=0)
+    sizeY = boards.shape[2]
+    turn = np.full(k, TILE_VALUE[toMove], dtype=np.int8)
+    passCount = np.full(k, passes, dtype=np.int8)
+    played = np.zeros(k, dtype=np.int32)
+
+    live = np.flatnonzero(passCount < 2)
+    while len(live):
+        counts = flipCounts(boards[live], turn[live])
+        total = counts.sum(axis=0)
+        canMove = total.reshape(len(live), -1).any(axis=1)
+
+        if canMove.any():
+            movers = np.flatnonzero(canMove)
+            flat = chooseMoves(total[movers], epsilon, rng)
+            xs, ys = flat // sizeY, flat % sizeY
+            playMoves(boards, turn[live[movers]], live[movers], xs, ys, counts[:, movers, xs, ys])
+            played[live[movers]] += 1
+
+        passCount[live] = np.where(canMove, 0, passCount[live] + 1)
+        turn[live] = -turn[live]
+        live = np.flatnonzero(passCount < 2)
+
+    mine = (boards == TILE_VALUE[tile]).sum(axis=(1, 2))
+    theirs = (boards == -TILE_VALUE[tile]).sum(axis=(1, 2))
+    results = np.sign(mine - theirs).astype(np.int8)
+    return (results, played) if lengths else results
+
+
+if __name__ == '__main__':
+    from time import perf_counter
+    b = BitBoard(stones=[(1, 6), (6, 6)])
+    for k in (1, 8, 64, 256, 1024):
+        t = perf_counter()
+        results = batchRollout(b, 'X', 'X', k)
+        elapsed = perf_counter() - t
+        print(f'K={k:5d}: {k / elapsed:8.1f} rollouts/s  (wins {np.sum(results == 1)}, draws {np.sum(results == 0)})')
@@ -0,0 +1,195 @@
+########################
+# Benchmark suite: move generation correctness (perft) and engine throughput, per board geometry.
+#   perft            number of leaf positions 'depth' plies from the initial position. A pass counts as a
+#                    ply and a finished game as a leaf. The counts are exact: a change in them is a
+#                    move generation bug, not a slowdown
+#   perftPerSec      perft positions per second
+#   validMovesPerSec getValidMoves calls per second, on positions from seeded greedy games
+#   greedyPerSec     chooseGreedyMove decisions per second, on the same positions
+#   rolloutsPerSec   greedyPlayout rollouts per second from the initial position
+#   mctsPerSec       MCTS iterations per second from the initial position
+#   compactPerSec    the same with the array-backed compact_tree.CompactTree
+# Everything random is seeded, so two runs do the same work. Results can be saved as a JSON baseline and
+# compared with one later: a throughput more than 'threshold' below the baseline, or any perft count that
+# differs, is flagged and makes the command exit with status 1.
+########################
+
+import argparse
+import json
+import platform
+import random
+import sys
+from time import perf_counter
+
+import numpy as np
+
+import greedy_base as gb
+from bitboard import BitBoard, otherTile, iterBits
+
+# name: (sizeX, sizeY, stones, perft depth)
+GEOMETRIES = {
+    'standard': (8, 8, [], 6),
+    'server': (8, 8, [(1, 6), (6, 6)], 6),
+    '10x10': (10, 10, [(2, 6), (2, 7), (3, 7), (6, 2), (7, 2), (7, 3)], 5),
+    '16x16': (16, 16, [], 4),
+    '24x24': (24, 24, [], 4),
+}
+RATES = ('perftPerSec', 'validMovesPerSec', 'greedyPerSec', 'rolloutsPerSec', 'mctsPerSec', 'compactPerSec')
+
+
+def perft(board, tile, depth, passes=0):
+    # Leaf positions 'depth' plies below this one (the board is left as it was).
+    if depth == 0 or passes >= 2:
+        return 1
+    moves = board.validMovesMask(tile)
+    if not moves:
+        return perft(board, otherTile(tile), depth - 1, passes + 1)
+    if depth == 1:
+        return moves.bit_count()
+    sizeY = board.sizeY
+    other = otherTile(tile)
+    nodes = 0
+    for index in iterBits(moves):
+        undo = board.make_move(tile, index // sizeY, index % sizeY)
+        nodes += perft(board, other, depth - 1)
+        board.unmake_move(undo)
+    return nodes
+
+
+def _rate(run, seconds):
+    # Calls run() (which returns the amount of work it did) until 'seconds' have passed; work per second.
+    work = 0
+    t = perf_counter()
+    while True:
+        work += run()
+        elapsed = perf_counter() - t
+        if elapsed >= seconds:
+            return work / elapsed
+
+
+def _positions(newBoard, games=4, seed=0):
+    # (board, tile) of every position of a few seeded epsilon-greedy games.
+    random.seed(seed)
+    positions = []
+    for _ in range(games):
+        board, tile, passes = newBoard(), 'X', 0
+        while passes < 2:
+            positions.append((board.copy(), tile))
+            move = gb.chooseGreedyMove(board, tile, epsilon=.3)
+            if move is None:
+                passes += 1
+            else:
+                passes = 0
+                board.makeMove(tile, move[0], move[1])
+            tile = otherTile(tile)
+    return positions
+
+
+def benchmarkGeometry(sizeX, sizeY, stones, depth, seconds=1., seed=0):
+    from compact_tree import CompactTree
+    from mcts import MonteCarloTreeSearchNode
+    newBoard = lambda: BitBoard(sizeX, sizeY, stones)
+    result = {'perft': {}}
+    board = newBoard()
+    t = perf_counter()
+    for d in range(1, depth + 1):
+        result['perft'][str(d)] = perft(board, 'X', d)
+    result['perftPerSec'] = sum(result['perft'].values()) / (perf_counter() - t)
+
+    positions = _positions(newBoard, seed=seed)
+
+    def validMoves():
+        for board, tile in positions:
+            board.getValidMoves(tile)
+        return len(positions)
+    result['validMovesPerSec'] = _rate(validMoves, seconds)
+
+    random.seed(seed)
+
+    def greedy():
+        for board, tile in positions:
+            gb.chooseGreedyMove(board, tile, epsilon=.1)
+        return len(positions)
+    result['greedyPerSec'] = _rate(greedy, seconds)
+
+    random.seed(seed)
+    board = newBoard()
+    undo = []
+
+    def rollout():
+        gb.greedyPlayout(board, 'X', 0, 'X', undo)
+        while undo:
+            board.unmake_move(undo.pop())
+        return 1
+    result['rolloutsPerSec'] = _rate(rollout, seconds)
+
+    random.seed(seed)
+    np.random.seed(seed)
+    root = MonteCarloTreeSearchNode(newBoard(), True, None, None, 'X')
+    t = perf_counter()
+    root.search(seconds)
+    result['mctsPerSec'] = root.n() / (perf_counter() - t)
+
+    random.seed(seed)
+    tree = CompactTree(newBoard(), 'X')
+    t = perf_counter()
+    tree.search(seconds)
+    result['compactPerSec'] = tree.visits[0] / (perf_counter() - t)
+    return result
+
+
+def runSuite(names=None, seconds=1., depth=None, seed=0):
+    results = {'python': platform.python_version(), 'platform': platform.platform(), 'seconds': seconds,
+               'geometries': {}}
+    for name in names or GEOMETRIES:
+        sizeX, sizeY, stones, defaultDepth = GEOMETRIES[name]
+        result = benchmarkGeometry(sizeX, sizeY, stones, depth or defaultDepth, seconds, seed)
+        results['geometries'][name] = result
+        print(f'{name:>9}: perft({len(result["perft"])}) = {result["perft"][str(len(result["perft"]))]:>9}  '
+              + '  '.join(f'{rate} {result[rate]:10.1f}' for rate in RATES))
+    return results
+
+
+def compare(results, baseline, threshold=.1):
+    # Lines describing every regression of 'results' against 'baseline' (empty if there is none).
+    problems = []
+    for name, result in results['geometries'].items():
+        base = baseline['geometries'].get(name)
+        if base is None:
+            continue
+        for d, count in result['perft'].items():
+            if d in base['perft'] and base['perft'][d] != count:
+                problems.append(f'{name}: perft({d}) = {count}, baseline {base["perft"][d]}')
+        for rate in RATES:
+            if rate in base and result[rate] < base[rate] * (1 - threshold):
+                problems.append(f'{name}: {rate} {result[rate]:.1f}, baseline {base[rate]:.1f} '
+                                f'({100 * (result[rate] / base[rate] - 1):+.0f}%)')
+    return problems
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Perft and throughput benchmarks')
+    parser.add_argument('geometries', nargs='*', help=f'geometries to run, among {", ".join(GEOMETRIES)} (default: all)')
+    parser.add_argument('--seconds', type=float, default=1., help='time spent on each throughput measure')
+    parser.add_argument('--depth', type=int, default=None, help='perft depth (default: per geometry)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', metavar='FILE', help='write the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='FILE', help='flag the regressions against a JSON baseline')
+    parser.add_argument('--threshold', type=float, default=.1,
+                        help='slowdown flagged by --compare, as a fraction of the baseline')
+    args = parser.parse_args()
+    unknown = set(args.geometries) - set(GEOMETRIES)
+    if unknown:
+        parser.error(f'unknown geometries: {", ".join(sorted(unknown))}')
+    results = runSuite(args.geometries, args.seconds, args.depth, args.seed)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            problems = compare(results, json.load(f), args.threshold)
+        for problem in problems:
+            print('REGRESSION', problem)
+        if problems:
+            sys.exit(1)
+        print(f'No regression against {args.compare} (threshold {100 * args.threshold:.0f}%)')
@@ -0,0 +1,302 @@
+########################
+# Bitboard engine for Reversi.
+# Each colour and the stones ('*') are kept as Python integers used as bit masks. Square (x, y) is
+# bit x*sizeY + y, so walking the bits in ascending order visits the squares in the same x-major
+# order used by reversi.getValidMoves. Python big ints cover every size accepted by getNewBoard.
+#
+# The board also keeps its frontier: the empty squares next to at least one disc. Only those can be
+# legal moves, and the mask is updated incrementally by make_move/unmake_move. The same goes for the
+# running X/O/empty counts, so scoring a board never scans it.
+########################
+
+from geometry import getGeometry
+
+_TO_BITS = {
+    'X': str.maketrans({'X': '1', 'O': '0', '*': '0', ' ': '0', '.': '0'}),
+    'O': str.maketrans({'X': '0', 'O': '1', '*': '0', ' ': '0', '.': '0'}),
+    # anything that is not a disc or an empty square blocks lines like a stone
+    '*': str.maketrans({'X': '0', 'O': '0', '*': '1', ' ': '0', '.': '1'}),
+}
+
+
+def otherTile(tile):
+    return 'O' if tile == 'X' else 'X'
+
+
+def shift(bits, amount, mask):
+    # Moves every bit of 'bits' one square along a direction, dropping the ones that leave the board.
+    if amount > 0:
+        return (bits << amount) & mask
+    return (bits >> -amount) & mask
+
+
+def iterBits(bits):
+    # Yields the index of every set bit, lowest first.
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+class BitBoard:
+    def __init__(self, sizeX=8, sizeY=8, stones=[]):
+        # Same layout as reversi.getNewBoard.
+        self._setGeometry(getGeometry(sizeX, sizeY, stones))
+        halfX = sizeX // 2
+        halfY = sizeY // 2
+        self.discs = {
+            'X': (self.bit(halfX-1, halfY-1) | self.bit(halfX, halfY)) & ~self.stones,
+            'O': (self.bit(halfX-1, halfY) | self.bit(halfX, halfY-1)) & ~self.stones,
+        }
+        self.frontier = self.neighbours(self.discs['X'] | self.discs['O']) & self.empty()
+        self._countDiscs()
+
+    def _countDiscs(self):
+        self.counts = {'X': self.discs['X'].bit_count(), 'O': self.discs['O'].bit_count(),
+                       ' ': self.empty().bit_count()}
+
+    def key(self, toMove, passes=0):
+        # Zobrist key of the position: discs, side to move and number of consecutive passes.
+        # It is computed on demand, as the search only needs it when expanding a node; keeping it up to
+        # date in make_move/unmake_move would tax every rollout move.
+        g = self.geometry
+        h = g.zobristToMove[toMove] ^ g.zobristPasses[min(passes, 2)]
+        for tile in ('X', 'O'):
+            keys = g.zobrist[tile]
+            for i in iterBits(self.discs[tile]):
+                h ^= keys[i]
+        return h
+
+    def _setGeometry(self, geometry):
+        # The tables are shared by every board of the same layout; the most used ones are also kept
+        # as attributes to save a lookup in the move routines.
+        self.geometry = geometry
+        self.sizeX = geometry.sizeX
+        self.sizeY = geometry.sizeY
+        self.stones = geometry.stoneBits
+        self.full = geometry.full
+        self.directions = geometry.directions
+
+    @classmethod
+    def fromBoard(cls, board):
+        # Converts a list-of-lists board (as returned by reversi.getNewBoard) to a BitBoard.
+        bb = cls.__new__(cls)
+        sizeY = len(board[0])
+        cells = ''.join(map(''.join, board))[::-1]
+        stones = [(i // sizeY, i % sizeY) for i in iterBits(int(cells.translate(_TO_BITS['*']), 2))]
+        bb._setGeometry(getGeometry(len(board), sizeY, stones))
+        bb.discs = {
+            'X': int(cells.translate(_TO_BITS['X']), 2),
+            'O': int(cells.translate(_TO_BITS['O']), 2),
+        }
+        bb.frontier = bb.neighbours(bb.discs['X'] | bb.discs['O']) & bb.empty()
+        bb._countDiscs()
+        return bb
+
+    def toBoard(self):
+        # Converts back to the list-of-lists format used by the clients and the server.
+        board = []
+        for x in range(self.sizeX):
+            board.append([' '] * self.sizeY)
+        for tile, bits in (('X', self.discs['X']), ('O', self.discs['O']), ('*', self.stones)):
+            for i in iterBits(bits):
+                board[i // self.sizeY][i % self.sizeY] = tile
+        return board
+
+    def __reduce__(self):
+        # Pickles only the layout parameters and the masks; the tables are rebuilt (or taken from the
+        # cache) by getGeometry on the other side, e.g. in a worker process.
+        g = self.geometry
+        return (_restore, (g.sizeX, g.sizeY, g.stones, self.discs['X'], self.discs['O']))
+
+    def copy(self):
+        dupe = self.__class__.__new__(self.__class__)
+        dupe.__dict__.update(self.__dict__)
+        dupe.discs = dict(self.discs)
+        dupe.counts = dict(self.counts)
+        return dupe
+
+    # Read-only list-of-lists access (len(board), len(board[0]), board[x][y]), so helpers written for
+    # the list format, such as greedy_base.isOnCorner, also take a BitBoard.
+    def __len__(self):
+        return self.sizeX
+
+    def __getitem__(self, x):
+        if not 0 <= x < self.sizeX:
+            raise IndexError('board index out of range')
+        column = []
+        for y in range(self.sizeY):
+            bit = self.geometry.bits[x * self.sizeY + y]
+            if self.discs['X'] & bit:
+                column.append('X')
+            elif self.discs['O'] & bit:
+                column.append('O')
+            elif self.stones & bit:
+                column.append('*')
+            else:
+                column.append(' ')
+        return column
+
+    def bit(self, x, y):
+        return self.geometry.bits[x * self.sizeY + y]
+
+    def isOnBoard(self, x, y):
+        return 0 <= x < self.sizeX and 0 <= y < self.sizeY
+
+    def empty(self):
+        return self.full & ~(self.discs['X'] | self.discs['O'] | self.stones)
+
+    def neighbours(self, bits):
+        # Squares adjacent (in any of the eight directions) to at least one square of 'bits'.
+        around = 0
+        for amount, mask in self.directions:
+            around |= shift(bits, amount, mask)
+        return around
+
+    def validMovesMask(self, tile):
+        # Every frontier square that closes a line of opponent discs ending on one of ours,
+        # found by sliding our discs over the opponent's discs in each direction.
+        own = self.discs[tile]
+        opp = self.discs[otherTile(tile)]
+        frontier = self.frontier
+        moves = 0
+        for amount, mask in self.directions:
+            run = shift(own, amount, mask) & opp
+            while run:
+                run = shift(run, amount, mask)
+                moves |= run & frontier
+                run &= opp
+        return moves
+
+    def flipsMask(self, tile, index):
+        # Opponent discs flipped by playing 'tile' on square 'index' (0 if the move flips nothing),
+        # walking the precomputed rays of the square.
+        own = self.discs[tile]
+        opp = self.discs[otherTile(tile)]
+        bits = self.geometry.bits
+        flipped = 0
+        for ray in self.geometry.rays[index]:
+            line = 0
+            for i in ray:
+                bit = bits[i]
+                if opp & bit:
+                    line |= bit
+                else:
+                    if own & bit:
+                        flipped |= line
+                    break
+        return flipped
+
+    def moveFlips(self, tile):
+        # (square, number of discs flipped) of every legal move of 'tile', lowest square first like
+        # getValidMoves, in one sweep over the rays of the frontier squares: a frontier square is a legal
+        # move exactly when it flips something.
+        own = self.discs[tile]
+        opp = self.discs[otherTile(tile)]
+        bits = self.geometry.bits
+        rays = self.geometry.rays
+        moves = []
+        frontier = self.frontier
+        while frontier:
+            low = frontier & -frontier
+            frontier ^= low
+            index = low.bit_length() - 1
+            flips = 0
+            for ray in rays[index]:
+                run = 0
+                for i in ray:
+                    bit = bits[i]
+                    if opp & bit:
+                        run += 1
+                    else:
+                        if own & bit:
+                            flips += run
+                        break
+            if flips:
+                moves.append((index, flips))
+        return moves
+
+    def flipsList(self, tile, index):
+        # Same as flipsMask, but as the list of [x, y] produced by reversi.isValidMove.
+        own = self.discs[tile]
+        opp = self.discs[otherTile(tile)]
+        bits = self.geometry.bits
+        sizeY = self.sizeY
+        tilesToFlip = []
+        for ray in self.geometry.rays[index]:
+            line = []
+            for i in ray:
+                bit = bits[i]
+                if opp & bit:
+                    line.append(i)
+                else:
+                    if own & bit:
+                        tilesToFlip.extend([j // sizeY, j % sizeY] for j in reversed(line))
+                    break
+        return tilesToFlip
+
+    def isValidMove(self, tile, x, y):
+        if not self.isOnBoard(x, y) or not (self.frontier >> (x * self.sizeY + y)) & 1:
+            return False
+        return self.flipsList(tile, x * self.sizeY + y) or False
+
+    def getValidMoves(self, tile):
+        return [[i // self.sizeY, i % self.sizeY] for i in iterBits(self.validMovesMask(tile))]
+
+    def makeMove(self, tile, x, y):
+        # Returns False if this is an invalid move, True if it is valid.
+        return self.make_move(tile, x, y) != False
+
+    def make_move(self, tile, x, y):
+        # Plays the move in place and returns the undo record (tile, placed square, flipped squares mask,
+        # squares it added to the frontier, number of flipped discs) to be given back to unmake_move.
+        # Returns False if this is an invalid move.
+        index = x * self.sizeY + y
+        if not self.isOnBoard(x, y) or not (self.frontier >> index) & 1:
+            return False
+        flipped = self.flipsMask(tile, index)
+        if not flipped:
+            return False
+        placed = self.geometry.bits[index]
+        self.discs[tile] |= flipped | placed
+        self.discs[otherTile(tile)] &= ~flipped
+        added = self.geometry.neighbourMasks[index] & self.empty() & ~self.frontier
+        self.frontier = (self.frontier & ~placed) | added
+        flips = flipped.bit_count()
+        counts = self.counts
+        counts[tile] += flips + 1
+        counts[otherTile(tile)] -= flips
+        counts[' '] -= 1
+        return (tile, index, flipped, added, flips)
+
+    def unmake_move(self, undo):
+        # Reverts a move played by make_move.
+        tile, index, flipped, added, flips = undo
+        placed = self.geometry.bits[index]
+        self.discs[tile] &= ~(flipped | placed)
+        self.discs[otherTile(tile)] |= flipped
+        self.frontier = (self.frontier & ~added) | placed
+        counts = self.counts
+        counts[tile] -= flips + 1
+        counts[otherTile(tile)] += flips
+        counts[' '] += 1
+
+    def getScore(self):
+        return {'X': self.counts['X'], 'O': self.counts['O']}
+
+
+def _restore(sizeX, sizeY, stones, discsX, discsO):
+    bb = BitBoard.__new__(BitBoard)
+    bb._setGeometry(getGeometry(sizeX, sizeY, stones))
+    bb.discs = {'X': discsX, 'O': discsO}
+    bb.frontier = bb.neighbours(discsX | discsO) & bb.empty()
+    bb._countDiscs()
+    return bb
+
+
+def fromBoard(board):
+    return BitBoard.fromBoard(board)
+
+
+def toBoard(bb):
+    return bb.toBoard()
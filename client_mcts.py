@@ -1,10 +1,18 @@
+import argparse
 import socket
 import json
 from copy import deepcopy
+from time import perf_counter
 
 import reversi as rev
 from greedy_base import chooseGreedyMove
+from endgame import ENDGAME_EMPTIES
 from mcts import MonteCarloTreeSearchNode
+from opening_book import BOOK_DIR, openBook
+from ponder import Ponderer
+from search_profile import SearchProfile
+from time_manager import TimeManager
+from transposition import TranspositionTable
 
 
 def receiveMsg(conn):
@@ -41,6 +49,43 @@ def sendMCTSMove(client_socket, moveMsg):
     # waits for confirmation
     assert receiveMsg(client_socket) == 'ok'
 
+
+def searchMCTSMove(root, manager=None, started=None, workers=1, parallel='root', endgame_empties=ENDGAME_EMPTIES,
+                   book_dir=BOOK_DIR, profile=None, batch_size=0):
+    # Plays the opening book move of the position if there is one (book_dir None turns the book off);
+    # otherwise runs best_action on 'root', under the time manager's clock for this move if there is one.
+    # The search profile of the move is added to 'profile' (a SearchProfile) if one is given.
+    book = openBook(root.state.geometry, book_dir) if book_dir else None
+    entry = book.lookup(root.state, root.to_move(), root.passes) if book is not None else None
+    if entry is not None:
+        move, visits = entry
+        print(f"Opening book: {move[0]} {move[1]} ({visits} playouts)")
+        return root.choose_action(root.child_for(move))
+    clock = manager.startMove(root.state, root.tile, started) if manager is not None else None
+    action = root.best_action(batch_size, workers=workers, parallel=parallel, clock=clock,
+                              endgame_empties=endgame_empties, profile=SearchProfile() if profile is not None else None)
+    if root.profile is not None:
+        profile.merge(root.profile)
+    if root.solver is not None:
+        print("Endgame solver:", root.solver.report())
+    if root.proven is not None:
+        print("Search proved a", {-1: 'win', 0: 'draw', 1: 'loss'}[root.proven])
+    if clock is not None:
+        points = manager.finish(clock)
+        print(f"Search time: {clock.elapsed():.2f}s (soft limit {clock.soft:.2f}s, stopped: "
+              f"{clock.reason or 'soft limit'}), penalty {points}")
+    return action
+
+
+def logProfile(profile, every, force=False):
+    # Prints the profile of the last 'every' searched moves (or of what is left, with force) and returns
+    # the profile to go on with.
+    if profile is None or not profile.moves or (profile.moves < every and not force):
+        return profile
+    print(f"Search profile ({profile.moves} moves):", profile.summary())
+    return SearchProfile()
+
+
 def message_to_board(full_message):
     str_board = full_message.split(maxsplit=1)
     assert str_board[0] == 'board', f'Received {full_message}'
@@ -113,7 +158,27 @@ def client_program():
     client_socket.close()  # close the connection
 
 
-def client_program_mcts():
+def client_program_mcts(workers=1, parallel='root', tt_size=1 << 16, ponder=False, max_time=None, penalty_budget=0,
+                        endgame_empties=ENDGAME_EMPTIES, rave=0, widening=0, bias=0, book_dir=BOOK_DIR,
+                        profile_every=0, batch_size=0):
+    # workers > 1 runs every search on a persistent pool of that many processes (see parallel_mcts)
+    # tt_size is the capacity of the transposition table of each match (0 turns it off)
+    # ponder keeps growing the tree of our last move while waiting for the adversary's (see ponder)
+    # max_time turns on the time manager (see time_manager), which may spend up to penalty_budget points
+    # per match; without it every move is searched for best_action's default time
+    # endgame_empties is where the exact endgame solver takes over (0 turns it off)
+    # rave > 0 blends all-moves-as-first statistics into the selection, widening > 0 limits the children
+    # of a node by its visits and bias > 0 adds the move priors to the selection (see MonteCarloTreeSearchNode)
+    # book_dir holds the opening books (see opening_book), None turns them off
+    # profile_every > 0 prints the search profile (see search_profile) of every profile_every searched moves
+    # batch_size > 0 plays each new leaf out batch_size times at once with NumPy (see batch_rollout): more
+    # playouts per second but fewer nodes, for when single playouts are too noisy to rank the moves
+    profile = SearchProfile() if profile_every else None
+    manager = TimeManager(max_time, penalty_budget=penalty_budget) if max_time else None
+    if workers > 1:
+        from parallel_mcts import warmUp
+        warmUp(workers)
+
     host = socket.gethostname()  # assumes that server and clients are running on the same pc
     port = 5123  # socket server port number
 
@@ -137,18 +202,26 @@ def client_program_mcts():
             board = message_to_board(data)
             data = receiveMsg(client_socket)
         assert data.startswith('piece')
+        started = perf_counter()
+        table = TranspositionTable(tt_size) if tt_size else None
+        if manager is not None:
+            manager.newGame()
 
         if data == 'piece O':
             myPiece = 'O'
             advPiece = 'X'
             print('Playing with O')
-            root = MonteCarloTreeSearchNode(deepcopy(board), False, None, None, myPiece)
+            root = None
+            ponderer = None
         else:
             myPiece = 'X'
             advPiece = 'O'
             print('Playing with X (starting piece)')
-            root = MonteCarloTreeSearchNode(deepcopy(board), True, None, None, myPiece)
-            root = root.best_action()
+            root = MonteCarloTreeSearchNode(deepcopy(board), True, None, None, myPiece, table=table, rave=rave,
+                                            widening=widening, bias=bias)
+            root = searchMCTSMove(root, manager, started, workers, parallel, endgame_empties, book_dir, profile,
+                                  batch_size)
+            profile = logProfile(profile, profile_every)
             if root != 'pass':
                 move = root.parent_action
                 rev.makeMove(board, myPiece, move[0], move[1])
@@ -156,10 +229,13 @@ def client_program_mcts():
             else:
                 # passCount += 1
                 move = root
+                root = None
             sendMCTSMove(client_socket, move)
+            ponderer = Ponderer(root, batch_size).start() if ponder and root is not None else None
 
         # receives the adversary move
         data = receiveMsg(client_socket)
+        started = perf_counter()
 
         while not data.startswith('end'):
             # parses adversary move
@@ -168,19 +244,37 @@ def client_program_mcts():
             rev.drawBoard(board)
             if advMove[1] == 'pass':
                 print("Adversary passed")
-                root = MonteCarloTreeSearchNode(root.state, True, root, root.parent_action, root.tile)
+                advAction = 'pass'
             else:
                 print("Adversary move:", advMove[1], advMove[2])
                 rev.makeMove(board, advPiece, int(advMove[1]), int(advMove[2]))
-                root = MonteCarloTreeSearchNode(deepcopy(board), True, root, root.parent_action, root.tile)
+                advAction = (int(advMove[1]), int(advMove[2]))
+
+            # 'root' is the node of our last move: if the search (or pondering) already explored the
+            # adversary's reply, continue from that subtree (its siblings are dropped), else start a new tree
+            if ponderer is not None:
+                reused, extra = ponderer.take(advAction)
+                print("Pondering:", extra, "extra playouts")
+            else:
+                reused = root.descendant([advAction]) if root is not None else None
+            if reused is not None:
+                print("Reused subtree:", reused.make_root(board), "nodes carried over")
+                root = reused
+            else:
+                print("Reused subtree: 0 nodes carried over")
+                root = MonteCarloTreeSearchNode(deepcopy(board), True, None, None, myPiece, table=table,
+                                                passes=1 if advAction == 'pass' else 0, rave=rave,
+                                                widening=widening, bias=bias)
 
             # draw board
 
             rev.drawBoard(board)
             # computes and sends a greedy move
             # sendGreedyMove(client_socket, board, myPiece)
-            action = root.best_action()
-            root = action if action != 'pass' else root
+            action = searchMCTSMove(root, manager, started, workers, parallel, endgame_empties, book_dir, profile,
+                                    batch_size)
+            profile = logProfile(profile, profile_every)
+            root = action if action != 'pass' else None
             if action != 'pass':
                 move = root.parent_action
                 rev.makeMove(board, myPiece, move[0], move[1])
@@ -189,10 +283,17 @@ def client_program_mcts():
                 move = action
             rev.drawBoard(board)
             sendMCTSMove(client_socket, move)
+            ponderer = Ponderer(root, batch_size).start() if ponder and root is not None else None
             # waits for adversary move
             data = receiveMsg(client_socket)
+            started = perf_counter()
 
+        if ponderer is not None:
+            ponderer.stop()
         print("Final score:", data[data.find(' ') + 1:])
+        profile = logProfile(profile, profile_every, force=True)
+        if manager is not None and manager.moves:
+            print(f"Time manager: {manager.searched / manager.moves:.2f}s per move, {manager.spent} penalty points")
         data = receiveMsg(client_socket)
 
     print("All matches finished by the server.")
@@ -200,4 +301,36 @@ def client_program_mcts():
 
 
 if __name__ == '__main__':
-    client_program_mcts()
+    parser = argparse.ArgumentParser(description='MCTS client for the Reversi server')
+    parser.add_argument('--workers', type=int, default=1, help='processes used by the parallel search')
+    parser.add_argument('--parallel', choices=['root', 'tree'], default='root',
+                        help='root-parallel (one tree per worker) or tree-parallel (one shared tree) search')
+    parser.add_argument('--tt-size', type=int, default=1 << 16,
+                        help='transposition table entries per match (0 turns it off)')
+    parser.add_argument('--ponder', action='store_true',
+                        help="keep searching while waiting for the adversary's move")
+    parser.add_argument('--max-time', type=float, default=None, metavar='SECONDS',
+                        help='let the time manager budget each move, up to SECONDS when it matters')
+    parser.add_argument('--penalty-budget', type=int, default=0,
+                        help='penalty points per match the time manager may spend on unsettled positions')
+    parser.add_argument('--endgame-empties', type=int, default=ENDGAME_EMPTIES,
+                        help='solve the position exactly from this many empty squares (0 turns it off)')
+    parser.add_argument('--rave', type=float, default=0,
+                        help='RAVE equivalence parameter: visits at which the AMAF and UCT means weigh the same '
+                             '(0 turns RAVE off)')
+    parser.add_argument('--widening', type=float, default=0,
+                        help='progressive widening: a node gets 1 + WIDENING * sqrt(visits) children (0 turns it off)')
+    parser.add_argument('--bias', type=float, default=0,
+                        help='weight of the move priors in the selection (progressive bias, 0 turns it off)')
+    parser.add_argument('--book-dir', default=BOOK_DIR, help='directory of the opening books (see opening_book)')
+    parser.add_argument('--no-book', action='store_true', help='always search, even in book positions')
+    parser.add_argument('--batch-size', type=int, default=0,
+                        help='play each new leaf out this many times at once with NumPy (0: one playout)')
+    parser.add_argument('--profile', type=int, default=0, metavar='N',
+                        help='print the time per search phase and the shape of the searches every N moves')
+    args = parser.parse_args()
+    client_program_mcts(workers=args.workers, parallel=args.parallel, tt_size=args.tt_size, ponder=args.ponder,
+                        max_time=args.max_time, penalty_budget=args.penalty_budget,
+                        endgame_empties=args.endgame_empties, rave=args.rave, widening=args.widening, bias=args.bias,
+                        book_dir=None if args.no_book else args.book_dir, profile_every=args.profile,
+                        batch_size=args.batch_size)
@@ -0,0 +1,282 @@
+########################
+# Compact MCTS tree kept in preallocated typed arrays (array.array), one slot per node, instead of one
+# MonteCarloTreeSearchNode object per node. A node costs 25 bytes and no Python object at all:
+#   visits, wins, losses  statistics, with results counted from the point of view of the root's tile
+#   parent, first, count  links: the children of a node are the contiguous slots first .. first+count-1
+#   move                  flat square index x*sizeY + y of the move leading to the node (-1 for a pass)
+#   toMove                side to move at the node (index in TILES)
+# No board is stored: the search plays the moves on one BitBoard while it descends and unmakes them after
+# each iteration. Passes are counted along the path.
+#
+# The search follows MonteCarloTreeSearchNode: untried moves are expanded one per iteration in random
+# order, selection uses the same UCT weights as best_child (c_param=.1) and the move played is the child
+# with the best mean (c_param=0.). Below the root the choice is made for the side to move at each node.
+########################
+
+import random
+from array import array
+from math import log, sqrt
+from time import perf_counter
+
+import numpy as np
+
+import reversi as rev
+import greedy_base as gb
+from batch_rollout import batchRollout
+from bitboard import BitBoard
+
+TILES = ('X', 'O')
+
+
+class CompactTree:
+    FIELDS = [('visits', 'i'), ('wins', 'i'), ('losses', 'i'), ('parent', 'i'), ('first', 'i'),
+              ('count', 'h'), ('move', 'h'), ('toMove', 'b')]
+
+    def __init__(self, state, tile, capacity=1 << 18, passes=0, toMove=None):
+        # 'tile' is the root's tile (the results are counted for it); 'toMove' defaults to it.
+        if not isinstance(state, BitBoard):
+            state = BitBoard.fromBoard(state)
+        self.state = state
+        self.tile = tile
+        self.passes = passes
+        self.capacity = capacity
+        for field, code in self.FIELDS:
+            setattr(self, field, array(code, bytes(capacity * array(code).itemsize)))
+        self.parent[0] = -1
+        self.move[0] = -1
+        self.toMove[0] = TILES.index(toMove or tile)
+        self.used = 1
+        self._views = {}
+
+    def __len__(self):
+        return self.used
+
+    @classmethod
+    def bytesPerNode(cls):
+        return sum(array(code).itemsize for _, code in cls.FIELDS)
+
+    def nbytes(self):
+        return self.capacity * self.bytesPerNode()
+
+    def node(self, index=0):
+        # The CompactNode view of a slot; views are cached so the same node is always the same object.
+        view = self._views.get(index)
+        if view is None:
+            view = self._views[index] = CompactNode(self, index)
+        return view
+
+    def expand(self, node, moves):
+        # Allocates the children of 'node' (one pass child if there is no move), in random order. Returns
+        # False if the store is full.
+        count = max(len(moves), 1)
+        first = self.used
+        if first + count > self.capacity:
+            return False
+        self.used += count
+        sizeY = self.state.sizeY
+        squares = [x * sizeY + y for x, y in moves] or [-1]
+        random.shuffle(squares)
+        toMove = 1 - self.toMove[node]
+        for child, square in enumerate(squares, first):
+            self.parent[child] = node
+            self.move[child] = square
+            self.toMove[child] = toMove
+        self.first[node] = first
+        self.count[node] = count
+        return True
+
+    def select(self, node, c_param=.1):
+        # The first untried child of 'node', or the UCT choice for the side to move there.
+        first = self.first[node]
+        end = first + self.count[node]
+        visits = self.visits
+        if not visits[end - 1]:
+            # children are tried in slot order, so the last one is untried until all of them are
+            for child in range(first, end):
+                if not visits[child]:
+                    return child
+        return self.best_child(node, c_param)
+
+    def best_child(self, node=0, c_param=.1):
+        # Same weights as MonteCarloTreeSearchNode.best_child, over the tried children of 'node'.
+        first = self.first[node]
+        visits, wins, losses = self.visits, self.wins, self.losses
+        sign = 1 if TILES[self.toMove[node]] == self.tile else -1
+        explore = 2 * log(visits[node]) if visits[node] else 0.
+        best, bestWeight = -1, None
+        for child in range(first, first + self.count[node]):
+            n = visits[child]
+            if n:
+                weight = sign * (wins[child] - losses[child]) / n + c_param * sqrt(explore / n)
+                if bestWeight is None or weight > bestWeight:
+                    best, bestWeight = child, weight
+        return best
+
+    def backpropagate(self, path, wins, losses, draws):
+        count = wins + losses + draws
+        for node in path:
+            self.visits[node] += count
+            self.wins[node] += wins
+            self.losses[node] += losses
+
+    def search(self, time_limit=.1, batch_size=0, stop=None, clock=None):
+        # Grows the tree for time_limit seconds; 'stop' and 'clock' work as in MonteCarloTreeSearchNode.
+        board = self.state
+        sizeY = board.sizeY
+        root = self.node(0)
+        undo = []
+        t = perf_counter()
+        while (perf_counter() - t) <= time_limit and not (stop is not None and stop.is_set()):
+            if clock is not None and clock.done(root):
+                break
+            node, p = 0, self.passes
+            path = [0]
+            while p < 2:
+                if not self.count[node]:
+                    # a leaf: expand it on its second visit, otherwise play out from it
+                    if node and not self.visits[node]:
+                        break
+                    if not self.expand(node, board.getValidMoves(TILES[self.toMove[node]])):
+                        break
+                child = self.select(node)
+                move = self.move[child]
+                if move < 0:
+                    p += 1
+                else:
+                    p = 0
+                    undo.append(rev.make_move(board, TILES[self.toMove[node]], move // sizeY, move % sizeY))
+                node = child
+                path.append(node)
+                if not self.visits[node]:
+                    break
+
+            tile = TILES[self.toMove[node]]
+            if batch_size:
+                results = batchRollout(board, self.tile, tile, batch_size, epsilon=.1, passes=p)
+                self.backpropagate(path, int(np.count_nonzero(results == 1)), int(np.count_nonzero(results == -1)),
+                                   int(np.count_nonzero(results == 0)))
+            else:
+                result = gb.greedyPlayout(board, tile, p, self.tile, undo)
+                self.backpropagate(path, result == 1, result == -1, result == 0)
+            while undo:
+                rev.unmake_move(board, undo.pop())
+
+    def best_action(self, batch_size=0, time_limit=.1, clock=None):
+        # Same contract as MonteCarloTreeSearchNode.best_action: 'pass' without a legal move, otherwise the
+        # chosen root child (a CompactNode with parent_action and its own board in 'state'). None if no
+        # playout ran (e.g. time_limit <= 0), since there is then nothing to choose from.
+        if not self.state.getValidMoves(TILES[self.toMove[0]]):
+            return 'pass'
+        if clock is not None:
+            time_limit = float('inf')
+        self.search(time_limit, batch_size, clock=clock)
+        best = self.best_child(0, c_param=0.)
+        if best < 0:
+            return None
+        chosen = self.node(best)
+        chosen.state = self.state.copy()
+        rev.makeMove(chosen.state, TILES[self.toMove[0]], chosen.parent_action[0], chosen.parent_action[1])
+        return chosen
+
+
+class CompactNode:
+    # A node of a CompactTree with the part of the MonteCarloTreeSearchNode interface used outside of the
+    # search (time_manager.MoveClock, the clients).
+    __slots__ = ('tree', 'index', 'state')
+    proven = None  # the compact search does not prove nodes
+    rave = 0
+
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+        self.state = None
+
+    @property
+    def parent_action(self):
+        move = self.tree.move[self.index]
+        if move < 0:
+            return 'pass'
+        sizeY = self.tree.state.sizeY
+        return (move // sizeY, move % sizeY)
+
+    @property
+    def children(self):
+        tree = self.tree
+        first = tree.first[self.index]
+        return [tree.node(c) for c in range(first, first + tree.count[self.index]) if tree.visits[c]]
+
+    def n(self):
+        return self.tree.visits[self.index]
+
+    def q(self):
+        return self.tree.wins[self.index] - self.tree.losses[self.index]
+
+    def is_fully_expanded(self):
+        tree = self.tree
+        count = tree.count[self.index]
+        return count > 0 and tree.visits[tree.first[self.index] + count - 1] > 0
+
+    def is_expandable(self):
+        return not self.is_fully_expanded()
+
+    def best_child(self, c_param=.1):
+        return self.tree.node(self.tree.best_child(self.index, c_param))
+
+
+def benchmark(iterations=20000, selections=20000):
+    # Bytes per node and best_child speed of MonteCarloTreeSearchNode against CompactTree.
+    import tracemalloc
+    from timeit import timeit
+    from mcts import MonteCarloTreeSearchNode
+
+    board = BitBoard(stones=[(1, 6), (6, 6)])
+    board.makeMove('X', 2, 3)
+    board.makeMove('O', 2, 2)
+
+    # object nodes: add_child is how the search creates them
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    root = MonteCarloTreeSearchNode(board.copy(), True, None, None, 'X')
+    parent = root
+    undo = []
+    moves = root.get_legal_actions(parent.state, 'X')
+    for i in range(iterations):
+        x, y = moves[i % len(moves)]
+        child = parent.add_child(parent.state, undo, x, y)
+        rev.unmake_move(parent.state, undo.pop())
+        child.backpropagate(1)
+    objectBytes = (tracemalloc.get_traced_memory()[0] - before) / (iterations + 1)
+    tracemalloc.stop()
+    print(f'MonteCarloTreeSearchNode: {objectBytes:7.1f} bytes per node')
+
+    tree = CompactTree(board.copy(), 'X')
+    t = perf_counter()
+    tree.search(1.)
+    print(f'CompactTree:              {CompactTree.bytesPerNode():7.1f} bytes per node '
+          f'({tree.used} nodes after a 1 s search, {tree.visits[0] / (perf_counter() - t):.0f} playouts/s)')
+
+    # best_child over the same statistics
+    root = MonteCarloTreeSearchNode(board.copy(), True, None, None, 'X')
+    tree = CompactTree(board.copy(), 'X')
+    tree.expand(0, moves)
+    slots = {tree.move[c]: c for c in range(tree.first[0], tree.first[0] + tree.count[0])}
+    rng = random.Random(1)
+    for x, y in moves:
+        child = root.add_child(root.state, undo, x, y)
+        rev.unmake_move(root.state, undo.pop())
+        visits = rng.randint(1, 100)
+        wins = rng.randint(0, visits)
+        child._number_of_visits, child._results[1] = visits, wins
+        slot = slots[x * board.sizeY + y]
+        tree.visits[slot], tree.wins[slot] = visits, wins
+        root._number_of_visits += visits
+        tree.visits[0] += visits
+    assert root.best_child().parent_action == tree.node(tree.best_child(0)).parent_action
+    objectTime = timeit(root.best_child, number=selections) / selections
+    compactTime = timeit(lambda: tree.best_child(0), number=selections) / selections
+    print(f'best_child over {len(moves)} children: {objectTime * 1e6:.1f} us (objects), '
+          f'{compactTime * 1e6:.1f} us (compact), {objectTime / compactTime:.1f}x')
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,198 @@
+########################
+# Exact endgame solver: negamax with alpha-beta pruning on a BitBoard.
+# The value of a position is the final disc difference (side to move minus the other side), which is how
+# the server scores a match. The game ends after two passes in a row, as in
+# MonteCarloTreeSearchNode.is_game_over; a full board is just the case where neither side can move.
+# Stones ('*') are part of the board geometry: they are never empty, never flipped and they cut the lines.
+#
+# Move ordering, above ORDER_EMPTIES empty squares: the move stored in the transposition table first,
+# then the moves leaving the opponent the fewest replies, then (parity) the moves in a region of the board
+# with an odd number of empty squares, so that we tend to get the last move of each region.
+########################
+
+from time import perf_counter
+
+from bitboard import otherTile, iterBits
+
+# Empties at which best_action hands over to the solver by default. The solver gets half of the move's
+# time: at the default 0.1s budget it finishes random 8-empty positions of the server layout, but times out
+# on about a sixth of them at 9 empties and on 40% at 10, so raise it only with the budget.
+ENDGAME_EMPTIES = 8
+ORDER_EMPTIES = 5     # below this, moves are tried in board order: sorting would cost more than it saves
+
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class SolverTimeout(Exception):
+    pass
+
+
+class EndgameSolver:
+    def __init__(self, capacity=1 << 18):
+        self.capacity = capacity
+        self.table = {}
+        self.nodes = 0
+        self.elapsed = 0.
+        self.deadline = None
+        self.score = None  # result of the last solve that finished
+
+    def solve(self, board, tile, passes=0, time_limit=None):
+        # Returns (score, move) for 'tile' to play on 'board': the exact final disc difference with best
+        # play and a best move ([x, y], or None if 'tile' has to pass). Raises SolverTimeout if time_limit
+        # seconds are not enough; the board is restored either way.
+        self.nodes = 0
+        self.score = None
+        start = perf_counter()
+        self.deadline = None if time_limit is None else start + time_limit
+        if len(self.table) > self.capacity:
+            self.table.clear()
+        undo = []
+        try:
+            score, index = self._root(board, tile, passes, undo)
+        finally:
+            while undo:
+                board.unmake_move(undo.pop())
+            self.elapsed = perf_counter() - start
+        move = None if index is None else [index // board.sizeY, index % board.sizeY]
+        self.score = score
+        return score, move
+
+    def nodesPerSecond(self):
+        return self.nodes / max(self.elapsed, 1e-9)
+
+    def report(self):
+        result = 'timed out' if self.score is None else f'disc difference {self.score:+d}'
+        return f'{result}, {self.nodes} nodes in {self.elapsed:.3f}s ({self.nodesPerSecond():.0f} nodes/s)'
+
+    def _root(self, board, tile, passes, undo):
+        size = board.geometry.size
+        moves = board.validMovesMask(tile)
+        if not moves:
+            if passes >= 1:
+                return self._score(board, tile), None
+            return -self._negamax(board, otherTile(tile), -size, size, 1, undo), None
+        best, bestIndex = None, None
+        alpha = -size
+        for index in self._ordered(board, tile, moves):
+            undo.append(board.make_move(tile, index // board.sizeY, index % board.sizeY))
+            score = -self._negamax(board, otherTile(tile), -size, -alpha, 0, undo)
+            board.unmake_move(undo.pop())
+            if best is None or score > best:
+                best, bestIndex = score, index
+                alpha = max(alpha, score)
+        return best, bestIndex
+
+    def _score(self, board, tile):
+        counts = board.counts
+        return counts[tile] - counts[otherTile(tile)]
+
+    def _negamax(self, board, tile, alpha, beta, passes, undo):
+        self.nodes += 1
+        if self.deadline is not None and not self.nodes & 255 and perf_counter() > self.deadline:
+            raise SolverTimeout()
+        if not board.counts[' ']:
+            return self._score(board, tile)
+
+        moves = board.validMovesMask(tile)
+        if not moves:
+            if passes >= 1:
+                return self._score(board, tile)
+            return -self._negamax(board, otherTile(tile), -beta, -alpha, passes + 1, undo)
+
+        key = (board.discs['X'], board.discs['O'], tile)
+        entry = self.table.get(key)
+        hint = None
+        if entry is not None:
+            flag, value, hint = entry
+            if flag == EXACT:
+                return value
+            if flag == LOWER and value >= beta:
+                return value
+            if flag == UPPER and value <= alpha:
+                return value
+
+        original = alpha
+        best, bestIndex = None, None
+        sizeY = board.sizeY
+        other = otherTile(tile)
+        for index in self._ordered(board, tile, moves, hint):
+            undo.append(board.make_move(tile, index // sizeY, index % sizeY))
+            score = -self._negamax(board, other, -beta, -alpha, 0, undo)
+            board.unmake_move(undo.pop())
+            if best is None or score > best:
+                best, bestIndex = score, index
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        flag = UPPER if best <= original else (LOWER if best >= beta else EXACT)
+        self.table[key] = (flag, best, bestIndex)
+        return best
+
+    def _ordered(self, board, tile, moves, hint=None):
+        if board.counts[' '] < ORDER_EMPTIES:
+            indices = list(iterBits(moves))
+        else:
+            other = otherTile(tile)
+            odd = self._oddRegions(board)
+            sizeY = board.sizeY
+            keyed = []
+            for index in iterBits(moves):
+                undo = board.make_move(tile, index // sizeY, index % sizeY)
+                replies = board.validMovesMask(other).bit_count()
+                board.unmake_move(undo)
+                keyed.append((replies, not (odd >> index) & 1, index))
+            keyed.sort()
+            indices = [index for _, _, index in keyed]
+        if hint is not None and hint in indices:
+            indices.remove(hint)
+            indices.insert(0, hint)
+        return indices
+
+    def _oddRegions(self, board):
+        # Union of the regions (8-connected groups of empty squares) holding an odd number of squares.
+        empty = board.empty()
+        odd = 0
+        while empty:
+            region = empty & -empty
+            while True:
+                grown = (region | board.neighbours(region)) & empty
+                if grown == region:
+                    break
+                region = grown
+            if region.bit_count() % 2:
+                odd |= region
+            empty &= ~region
+        return odd
+
+
+def benchmark(positions=3, empties=(6, 8, 10, 12), seed=0):
+    # Time and nodes/s of the solver on positions reached by greedy play, to tune ENDGAME_EMPTIES.
+    import random
+    import greedy_base as gb
+    from bitboard import BitBoard
+    random.seed(seed)
+    solver = EndgameSolver()
+    for target in empties:
+        nodes = elapsed = 0
+        for _ in range(positions):
+            board = BitBoard(stones=[(1, 6), (6, 6)])
+            tile, passes = 'X', 0
+            while board.counts[' '] > target and passes < 2:
+                move = gb.chooseGreedyMove(board, tile, epsilon=.3)
+                if move is None:
+                    passes += 1
+                else:
+                    passes = 0
+                    board.makeMove(tile, move[0], move[1])
+                tile = otherTile(tile)
+            solver.table.clear()
+            solver.solve(board, tile, passes)
+            nodes += solver.nodes
+            elapsed += solver.elapsed
+        print(f'{target:2d} empties: {elapsed / positions:7.3f}s per solve, {nodes / max(elapsed, 1e-9):8.0f} nodes/s')
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,111 @@
+########################
+# Precomputed tables for one board geometry: the (sizeX, sizeY, stones) parameters given to
+# reversi.getNewBoard and sent by the server as board_param.
+# Squares are flat indices x*sizeY + y, the same numbering used by bitboard.BitBoard.
+########################
+
+import random
+from functools import lru_cache
+
+# same direction order used by reversi.isValidMove
+DIRECTIONS = [[0, 1], [1, 1], [1, 0], [1, -1], [0, -1], [-1, -1], [-1, 0], [-1, 1]]
+
+
+class Geometry:
+    def __init__(self, sizeX, sizeY, stones):
+        assert (4 < sizeX < 100) and (4 < sizeY < 100) and (sizeX % 2) == 0 and (sizeY % 2) == 0
+        self.sizeX = sizeX
+        self.sizeY = sizeY
+        self.stones = stones
+        self.size = sizeX * sizeY
+        self.full = (1 << self.size) - 1
+        self.bits = [1 << i for i in range(self.size)]
+
+        self.stoneBits = 0
+        for x, y in stones:
+            self.stoneBits |= self.bits[x * sizeY + y]
+        self.stoneCount = self.stoneBits.bit_count()
+
+        # Shift amount and mask of each direction for the bit-parallel passes: a shift with dy=+1 (or -1)
+        # must not land on the first (or last) row coming from the previous (or next) column.
+        firstRow = 0
+        for x in range(sizeX):
+            firstRow |= self.bits[x * sizeY]
+        lastRow = firstRow << (sizeY - 1)
+        self.directions = []
+        for dx, dy in DIRECTIONS:
+            mask = self.full
+            if dy == 1:
+                mask &= ~firstRow
+            elif dy == -1:
+                mask &= ~lastRow
+            self.directions.append((dx * sizeY + dy, mask))
+
+        # For each square, the squares seen in each direction until the edge or a stone, as ranges of flat
+        # indices. Rays shorter than two squares can never flip anything and are left out.
+        self.rays = []
+        self.neighbourMasks = []
+        openAxes = []
+        for x in range(sizeX):
+            for y in range(sizeY):
+                rays = []
+                around = 0
+                lengths = []
+                for dx, dy in DIRECTIONS:
+                    length = 0
+                    cx, cy = x + dx, y + dy
+                    while 0 <= cx < sizeX and 0 <= cy < sizeY and not (self.stoneBits >> (cx * sizeY + cy)) & 1:
+                        length += 1
+                        cx += dx
+                        cy += dy
+                    step = dx * sizeY + dy
+                    start = x * sizeY + y
+                    if length >= 1:
+                        around |= self.bits[start + step]
+                    if length >= 2:
+                        rays.append(range(start + step, start + step * (length + 1), step))
+                    lengths.append(length)
+                self.rays.append(tuple(rays))
+                self.neighbourMasks.append(around)
+                # DIRECTIONS[i] and DIRECTIONS[i + 4] are opposite: a disc can only be flipped along a line
+                # with a square on both sides
+                openAxes.append(sum(1 for i in range(4) if lengths[i] and lengths[i + 4]))
+
+        # Square classes, with the stones taken into account like the edges of the board: corners (no
+        # line through them, so a disc there is never flipped), edges (a single line) and, for every
+        # square next to a corner, the mask of those corners.
+        self.cornerBits = 0
+        self.edgeBits = 0
+        for index, axes in enumerate(openAxes):
+            if axes == 0:
+                self.cornerBits |= self.bits[index]
+            elif axes == 1:
+                self.edgeBits |= self.bits[index]
+        self.cornerNeighbours = [self.neighbourMasks[index] & self.cornerBits if not (self.cornerBits >> index) & 1
+                                 else 0 for index in range(self.size)]
+
+        # Zobrist keys: one per (square, colour), plus side to move and pass count. They come from a fixed
+        # seed derived from the layout, so every process computes the same hashes for the same position.
+        rng = random.Random(f'{sizeX}x{sizeY}:{stones}')
+        self.zobrist = {'X': [rng.getrandbits(64) for _ in range(self.size)],
+                        'O': [rng.getrandbits(64) for _ in range(self.size)]}
+        self.zobristToMove = {'X': rng.getrandbits(64), 'O': rng.getrandbits(64)}
+        self.zobristPasses = [rng.getrandbits(64) for _ in range(3)]
+
+    def index(self, x, y):
+        return x * self.sizeY + y
+
+    def isOnBoard(self, x, y):
+        return 0 <= x < self.sizeX and 0 <= y < self.sizeY
+
+
+@lru_cache(maxsize=32)
+def _cachedGeometry(sizeX, sizeY, stones):
+    return Geometry(sizeX, sizeY, stones)
+
+
+def getGeometry(sizeX=8, sizeY=8, stones=[]):
+    # Returns the (shared, read-only) geometry of a layout, building it only the first time it is seen.
+    # Stones may come as tuples or as the lists decoded from the server's JSON.
+    stones = tuple(sorted(set((x, y) for x, y in stones)))
+    return _cachedGeometry(sizeX, sizeY, stones)
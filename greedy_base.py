@@ -12,6 +12,7 @@ from collections import Counter
 import numpy as np
 from reversi import getValidMoves
 import reversi as rev
+from bitboard import BitBoard
 from time import perf_counter
 
 
@@ -32,39 +33,60 @@ def makeMove(board, tile, xstart, ystart):
     # print(tile, xstart, ystart)
     if not tilesToFlip:
         raise ValueError('invalid play')
+    if isinstance(board, BitBoard):
+        rev.makeMove(board, tile, xstart, ystart)
+        return board
     board[xstart][ystart] = tile
     for x, y in tilesToFlip:
         board[x][y] = tile
     return board
 
 def chooseGreedyMove(board, playerTile, epsilon=1.1, decrease=False):
+    # The candidates come with their flip counts from a single sweep (BitBoard.moveFlips), so no move is
+    # played to score it: the score after a move is the current count plus the flips plus one, so the
+    # move with the most flips is the one with the best score.
+    if not isinstance(board, BitBoard):
+        board = BitBoard.fromBoard(board)
     epsilon = epsilon**len(get_points(board)) if decrease else epsilon
-    validMoves = rev.getValidMoves(board, playerTile)
-    if not validMoves:
+    candidates = board.moveFlips(playerTile)
+    if not candidates:
         return None  # passed
 
     # randomize the order of the possible moves
-    random.shuffle(validMoves)
+    random.shuffle(candidates)
+    sizeY = board.sizeY
 
     if random.random() < epsilon:
-        return choice(validMoves)
+        index, _ = choice(candidates)
+        return [index // sizeY, index % sizeY]
 
     # always go for a corner if available.
-    for x, y in validMoves:
-        if isOnCorner(board, x, y):
-            return [x, y]
-
-    # go through all the possible moves and remember the best scoring move
-    bestScore = -1
-    for x, y in validMoves:
-        dupeBoard = rev.getBoardCopy(board)
-        rev.makeMove(dupeBoard, playerTile, x, y)
-        score = rev.getScoreOfBoard(dupeBoard)[playerTile]
-        if score > bestScore:
-            bestMove = [x, y]
-            bestScore = score
-
-    return bestMove
+    lastX = board.sizeX - 1
+    lastY = sizeY - 1
+    corners = (0, lastY, lastX * sizeY, lastX * sizeY + lastY)
+    for index, _ in candidates:
+        if index in corners:
+            return [index // sizeY, index % sizeY]
+
+    # otherwise the first of the moves flipping the most discs
+    index, _ = max(candidates, key=lambda candidate: candidate[1])
+    return [index // sizeY, index % sizeY]
+
+def greedyPlayout(board, tile, passes, rootTile, undo, epsilon=.1):
+    # Epsilon-greedy playout on 'board' with 'tile' to play; the moves are pushed on 'undo' and the result
+    # (1, 0 or -1) is seen from rootTile.
+    otherTile = {'X': 'O', 'O': 'X'}
+    while passes < 2:
+        move = chooseGreedyMove(board, tile, epsilon=epsilon, decrease=False)
+        if move is None:
+            passes += 1
+        else:
+            passes = 0
+            undo.append(rev.make_move(board, tile, move[0], move[1]))
+        tile = otherTile[tile]
+    score = rev.getScoreOfBoard(board)
+    mine, theirs = score[rootTile], score[otherTile[rootTile]]
+    return 1 if mine > theirs else (0 if mine == theirs else -1)
 
 def ucb(x,y,played_tiles,t):
     pass
@@ -91,6 +113,12 @@ def expansion(board, playerTile,move):
     return board
 
 def get_points(board):
+    # A BitBoard already carries its counts, so this is O(1) for it. Like counting the cells, it leaves
+    # out the cell kinds the board has none of.
+    if isinstance(board, BitBoard):
+        counts = {'X': board.counts['X'], 'O': board.counts['O'], ' ': board.counts[' '],
+                  '*': board.geometry.stoneCount}
+        return Counter({cell: count for cell, count in counts.items() if count})
     return sum((Counter(i) for i in board),Counter())
 
 def rollout(board,playerTile):
@@ -180,9 +208,18 @@ def chooseMSCTMove(real_board, playerTile,played_tiles,t,lim_game=5,lim_rollout=
 
     return bestMove
 
-if __name__ == '__main__':
-    b = rev.getNewBoard(stones=[(1,6), (6,6)])
-    p = 'X'
+def benchmark(seconds=3.):
+    # Epsilon-greedy rollouts per second (greedyPlayout, as in the MCTS search) from the opening position.
+    board = BitBoard(stones=[(1, 6), (6, 6)])
+    undo = []
+    rollouts = 0
     t = perf_counter()
-    rollout(b,p)
-    print(perf_counter() - t)
\ No newline at end of file
+    while perf_counter() - t < seconds:
+        greedyPlayout(board, 'X', 0, 'X', undo)
+        while undo:
+            rev.unmake_move(board, undo.pop())
+        rollouts += 1
+    print(f'{rollouts / (perf_counter() - t):.0f} rollouts/s')
+
+if __name__ == '__main__':
+    benchmark()
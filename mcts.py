@@ -1,31 +1,98 @@
+from math import sqrt
 from random import shuffle, sample
 
 import numpy as np
-from collections import defaultdict
 
 import reversi as rev
 import greedy_base as gb
+from bitboard import BitBoard
+from batch_rollout import batchRollout
+from endgame import ENDGAME_EMPTIES, EndgameSolver, SolverTimeout
+from transposition import NodeStats
 
 from tqdm import tqdm
 
 from time import perf_counter
 
-from copy import deepcopy
+
+# Prior of a move, from the class of its square (geometry) and the discs it flips: corners are good, the
+# squares next to an empty corner give it away, edges are a little better than inner squares, and every
+# flipped disc gives the opponent more moves.
+PRIOR_CORNER = 1.
+PRIOR_X_SQUARE = -1.
+PRIOR_EDGE = .25
+PRIOR_FLIP = -.02
+
+C_PARAM = .1  # exploration constant of the selection (best_child)
+EPSILON = .1  # probability of a random move in the rollouts
+
+
+def other_tile(tile):
+    return 'X' if tile == 'O' else 'O'
+
+
+def move_prior(board, index, flips):
+    # Prior of playing on square 'index' of 'board' (a BitBoard) and flipping 'flips' discs.
+    geometry = board.geometry
+    if (geometry.cornerBits >> index) & 1:
+        prior = PRIOR_CORNER
+    elif geometry.cornerNeighbours[index] & board.empty():
+        prior = PRIOR_X_SQUARE
+    elif (geometry.edgeBits >> index) & 1:
+        prior = PRIOR_EDGE
+    else:
+        prior = 0.
+    return prior + PRIOR_FLIP * flips
 
 
 class MonteCarloTreeSearchNode():
-    def __init__(self, state, player=True, parent=None, parent_action=None, tile=None, is_simulation=False):
+    def __init__(self, state, player=True, parent=None, parent_action=None, tile=None, is_simulation=False,
+                 table=None, passes=0, rave=None, widening=None, bias=None, c_param=None, epsilon=None):
+        # The search plays on a single mutable board: moves are made while descending and unmade after
+        # each iteration, so only the node that best_action is called on needs to keep a state.
+        # 'tile' is the tile the search plays for (the same in the whole tree); 'player' tells whether it is
+        # that tile's turn at this node and 'passes' counts the consecutive passes that led to it. Both are
+        # fixed when the node is created. The results of a node are counted from the point of view of the
+        # side that moved into it, so that best_child compares children from the side to move.
+        if state is not None and not isinstance(state, BitBoard):
+            state = BitBoard.fromBoard(state)
         self.state = state
         self.parent = parent
         self.tile = tile
         self.player = player
-        self.passes = 0
+        self.passes = passes
         self.parent_action = parent_action
         self.children = []
-        self._number_of_visits = 0
-        self._results = defaultdict(int)
-        self._results[1] = 0
-        self._results[-1] = 0
+        # Optional transposition table, shared by the whole tree (and by later roots created with this
+        # node as parent). Nodes of the same position then share one NodeStats; they stay separate nodes.
+        self.table = table if table is not None or parent is None else parent.table
+        self.depth = parent.depth + 1 if parent is not None else 0
+        # RAVE: with rave > 0 the node also keeps all-moves-as-first statistics, the results of the
+        # simulations where its move was played by the same side later on, from the same parent (see
+        # backpropagate_amaf). best_child blends them with the node's own mean, weighted by
+        # beta = sqrt(rave / (3n + rave)): rave is the number of visits at which both count about as much.
+        # Like the table, it is set on the root and inherited by the whole tree.
+        self.rave = rave if rave is not None or parent is None else parent.rave
+        self.amaf_visits = 0
+        self.amaf_q = 0
+        # Moves are expanded in the order of their prior (move_prior), best first. With widening > 0 a node
+        # only gets 1 + widening * sqrt(n) children, so the moves at the end of that order wait until the
+        # node has been visited enough (progressive widening). With bias > 0 selection adds
+        # bias * prior / (n + 1) to the UCT value of each child (progressive bias). Both are inherited too.
+        self.widening = widening if widening is not None or parent is None else parent.widening
+        self.bias = bias if bias is not None or parent is None else parent.bias
+        # Exploration constant of the selection and epsilon of the rollouts, inherited as well; they
+        # default to C_PARAM and EPSILON.
+        self.c_param = c_param if c_param is not None else (parent.c_param if parent is not None else C_PARAM)
+        self.epsilon = epsilon if epsilon is not None else (parent.epsilon if parent is not None else EPSILON)
+        self.prior = 0.
+        self.stats = NodeStats()
+        self._results = self.stats.results
+        self.solver = None  # the EndgameSolver of the last best_action, if it was tried
+        self.profile = None  # the SearchProfile of the last best_action, if one was given
+        # Proven result (1, 0 or -1, for the side that moved into the node) once the value of the node is
+        # certain: at the end of the game, then by the minimax rules of prove(). None until then.
+        self.proven = self.final_result(state) if self.is_game_over() and state is not None else None
         self._untried_actions = None
         self._untried_actions = self.untried_actions(state, tile)
         self.is_simulation = is_simulation
@@ -36,14 +103,39 @@ class MonteCarloTreeSearchNode():
         return
 
     def untried_actions(self,state,tile):
-        if self.player:
-            legal_actions = self.get_legal_actions(state,tile)
-            self._untried_actions = sample(legal_actions, len(legal_actions))
-        else:
+        # Moves of the side to move, shuffled and then sorted by prior so that expand pops the best one
+        # first. A side without a move passes, unless the game is over.
+        if self.is_game_over():
             self._untried_actions = []
+        else:
+            to_move = self.to_move()
+            legal_actions = self.get_legal_actions(state, to_move)
+            if legal_actions:
+                sizeY = state.sizeY
+                legal_actions = sample(legal_actions, len(legal_actions))
+                legal_actions.sort(key=lambda a: move_prior(state, a[0] * sizeY + a[1],
+                                                            state.flipsMask(to_move, a[0] * sizeY + a[1]).bit_count()))
+            self._untried_actions = legal_actions or ['pass']
         # return shuffled list of actions
         return self._untried_actions
 
+    def to_move(self):
+        return self.tile if self.player else other_tile(self.tile)
+
+    @property
+    def _number_of_visits(self):
+        return self.stats.visits
+
+    @_number_of_visits.setter
+    def _number_of_visits(self, visits):
+        self.stats.visits = visits
+
+    def share_stats(self, board):
+        # Takes the statistics of this position from the transposition table (the node is new, so it has
+        # none of its own yet).
+        self.stats = self.table.getOrCreate(board.key(self.to_move(), self.passes), self.depth)
+        self._results = self.stats.results
+
     def update_passes(self, passes):
         self.passes = passes
 
@@ -55,102 +147,351 @@ class MonteCarloTreeSearchNode():
     def n(self):
         return self._number_of_visits
 
-    def expand(self):
+    def expand(self, board, undo):
         # print(self._untried_actions)
-        x, y = self._untried_actions.pop()
+        action = self._untried_actions.pop()
         # print('prior expansion')
         # rev.drawBoard(self.state)
         # print('post exp')
-        next_state = self.move(deepcopy(self.state), deepcopy(self.tile), x, y)
-        child_node = MonteCarloTreeSearchNode(next_state, player=self.player, tile=self.tile, parent=self,
+        if action == 'pass':
+            return self.add_pass_child(board)
+        return self.add_child(board, undo, action[0], action[1])
+
+    def add_child(self, board, undo, x, y):
+        record = self.move(board, self.to_move(), x, y)
+        undo.append(record)
+        child_node = MonteCarloTreeSearchNode(board, player=not self.player, tile=self.tile, parent=self,
                                               parent_action=(x, y))
+        child_node.prior = move_prior(board, record[1], record[4])
+        return self._attach(child_node, board)
+
+    def add_pass_child(self, board):
+        child_node = MonteCarloTreeSearchNode(board, player=not self.player, tile=self.tile, parent=self,
+                                              parent_action='pass', passes=self.passes + 1)
+        return self._attach(child_node, board)
+
+    def child_for(self, action):
+        # The child reached by the move 'action' ((x, y)), added to the tree if it is not there yet.
+        action = tuple(action)
+        child = next((c for c in self.children if c.parent_action == action), None)
+        if child is None:
+            if list(action) in self._untried_actions:
+                self._untried_actions.remove(list(action))
+            undo = []
+            child = self.add_child(self.state, undo, action[0], action[1])
+            rev.unmake_move(self.state, undo.pop())
+        return child
+
+    def _attach(self, child_node, board):
+        child_node.state = None  # the board is shared, the child does not own it
+        if self.table is not None:
+            child_node.share_stats(board)
         self.children.append(child_node)
         return child_node
 
     def is_terminal_node(self):
         return self.is_game_over()
 
-    def rollout(self):
-        current_rollout_state = deepcopy(self.state)
-        pt = self.tile
-        et = 'X' if pt == 'O' else 'O'
-        while not self.is_game_over():
-            if self.player:
-                nowtile = pt
+    def rollout(self, board, undo):
+        # Plays an epsilon-greedy game out from this node on the shared board and returns its result for
+        # the side that moved into the node. The moves are pushed on 'undo' so search can revert them; the
+        # node itself is left untouched.
+        to_move = self.to_move()
+        return gb.greedyPlayout(board, to_move, self.passes, other_tile(to_move), undo, self.epsilon)
+
+    def rollout_batch(self, board, k, profile=None):
+        # Plays k epsilon-greedy games out from this node at once (see batch_rollout) and returns how many
+        # ended in each result, for the side that moved into the node. The board is left untouched.
+        to_move = self.to_move()
+        results = batchRollout(board, other_tile(to_move), to_move, k, epsilon=self.epsilon, passes=self.passes,
+                               lengths=profile is not None)
+        if profile is not None:
+            results, lengths = results
+            profile.rolloutLengths.update(lengths.tolist())
+        return {result: int(np.count_nonzero(results == result)) for result in (1, 0, -1)}
+
+    def backpropagate(self, result, count=1):
+        # 'result' is seen from the side that moved into this node; it changes sign at every ply up.
+        node = self
+        while node is not None:
+            node._number_of_visits += count
+            node._results[result] += count
+            result = -result
+            node = node.parent
+
+    def backpropagate_amaf(self, result, moves, played, root, count=1):
+        # Updates the AMAF statistics on the path from this node up to 'root'. 'moves' are the
+        # (tile, (x, y)) moves of the whole simulation from 'root', the first 'played' of them leading to
+        # this node; at each node, the children whose move was played by the side to move there from the
+        # node on get the result, seen from that side.
+        seen = set(moves[played:])
+        node = self
+        while True:
+            mover = node.to_move()
+            for child in node.children:
+                if (mover, child.parent_action) in seen:
+                    child.amaf_visits += count
+                    child.amaf_q -= result * count
+            if node is root:
+                break
+            if node.parent_action != 'pass':
+                played -= 1
+                seen.add(moves[played])
+            result = -result
+            node = node.parent
+
+    def value(self):
+        # Mean result of the node, blended with its AMAF mean when RAVE is on.
+        mean = self.q() / self.n()
+        if not self.amaf_visits:
+            return mean
+        beta = sqrt(self.rave / (3 * self.n() + self.rave))
+        return (1 - beta) * mean + beta * self.amaf_q / self.amaf_visits
+
+    def prove(self):
+        # MCTS-Solver: called on a node that has just been proven, it proves its ancestors in turn. A parent
+        # is lost for the side that moved into it as soon as one child is a win for the side to move; once
+        # every move has been proven, it takes the best of its children's results.
+        node = self
+        while node.parent is not None and node.parent.proven is None:
+            parent = node.parent
+            if node.proven == 1:
+                parent.proven = -1
+            elif parent.is_fully_expanded() and all(c.proven is not None for c in parent.children):
+                parent.proven = -max(c.proven for c in parent.children)
             else:
-                nowtile = et
-            # possible_moves = self.get_legal_actions(current_rollout_state,nowtile)
-            # # print(possible_moves)
-
-            ac = gb.chooseGreedyMove(current_rollout_state, nowtile, epsilon=.1, decrease=False)
-            if ac is None:
-                self.player = not self.player
-                self.passes += 1
-                continue
-            self.passes = 0
-            x, y = ac
-
-            # if not possible_moves:
-            #     self.player = not self.player
-            #     continue
-            # x,y = self.rollout_policy(possible_moves)
-
-            current_rollout_state = self.move(current_rollout_state, nowtile, x, y)
-            # self.player = not self.player
-        return self.game_result(current_rollout_state)
-
-    def backpropagate(self, result):
-        self._number_of_visits += 1.
-        self._results[result] += 1.
-        if self.parent:
-            self.parent.backpropagate(result)
+                break
+            node = parent
 
     def is_fully_expanded(self):
         # print('len de untried ',self._untried_actions,' len: ',len(self._untried_actions))
         return len(self._untried_actions) == 0
 
+    def is_expandable(self):
+        # True if the search should expand a new child here rather than select among the children.
+        if not self._untried_actions:
+            return False
+        return not self.widening or len(self.children) < 1 + self.widening * sqrt(self.n())
+
     def best_child(self, c_param=0.1):
-        choices_weights = [(c.q() / c.n()) + c_param * np.sqrt((2 * np.log(self.n()) / c.n())) for c in self.children]
-        return self.children[np.argmax(choices_weights)]
+        # Proven children are not searched any more: selection leaves them out (a node whose children are
+        # all proven is proven itself). The final choice (c_param=0.) ranks them by their proven result,
+        # counted double so that a proven win beats any mean and a proven loss comes after all of them.
+        # With RAVE, the means are blended with the AMAF statistics (value()).
+        mean = (lambda c: c.q() / c.n()) if not self.rave else MonteCarloTreeSearchNode.value
+        if c_param:
+            children = [c for c in self.children if c.proven is None] or self.children
+            choices_weights = [mean(c) + c_param * np.sqrt((2 * np.log(self.n()) / c.n())) for c in children]
+            if self.bias:
+                choices_weights = [w + self.bias * c.prior / (c.n() + 1) for w, c in zip(choices_weights, children)]
+        else:
+            children = self.children
+            choices_weights = [2 * c.proven if c.proven is not None else mean(c) for c in children]
+        return children[np.argmax(choices_weights)]
 
     def rollout_policy(self, possible_moves):
         return possible_moves[np.random.randint(len(possible_moves))]
 
-    def _tree_policy(self):
-        # current_node = self
-        # print('in tree, show child: ',self.children)
-        while not self.is_terminal_node():
-            if not self.is_fully_expanded():
-                return self.expand()
-            else:
-                return self.best_child()
-        return self.best_child()
+    def _tree_policy(self, board, undo, profile=None):
+        # Descends through the nodes that may not get a new child (is_expandable) and expands the first
+        # node that may, or stops at a node where the game is over or proven. The moves are played on
+        # 'board' and pushed on 'undo'. The expansion is timed in the optional SearchProfile.
+        node = self
+        while not node.is_terminal_node() and node.proven is None:
+            if node.is_expandable():
+                if profile is None:
+                    return node.expand(board, undo)
+                t = perf_counter()
+                child = node.expand(board, undo)
+                profile.add('expand', perf_counter() - t)
+                profile.nodes += 1
+                return child
+            node = node._descend(board, undo)
+        return node
+
+    def _descend(self, board, undo):
+        child = self.best_child(self.c_param)
+        if child.parent_action != 'pass':
+            x, y = child.parent_action
+            undo.append(rev.make_move(board, self.to_move(), x, y))
+        return child
 
-    def best_action(self):
+    def best_action(self, batch_size=0, time_limit=.1, workers=1, parallel='root', clock=None,
+                    endgame_empties=ENDGAME_EMPTIES, profile=None):
+        # With batch_size > 0, every expanded leaf gets one batch of batch_size playouts (batch_rollout)
+        # instead of a single rollout: more playouts per second (about 650/s for 64 games against 220/s for
+        # single rollouts on 8x8), spread over fewer nodes. With workers > 1 the search runs on a persistent
+        # process pool (see parallel_mcts), either root-parallel or, with parallel='tree', on one shared tree.
+        # A time_manager.MoveClock replaces time_limit: the search then stops when the clock says so, or,
+        # on the pool, at the clock's soft limit.
+        # With endgame_empties or fewer empty squares the position is first given to the exact endgame
+        # solver, with half of the time (of the soft limit with a clock); the search only runs if the solver
+        # does not finish (0 disables it).
+        # An optional search_profile.SearchProfile is filled by the search and kept in self.profile; the
+        # pool searches only give it their iterations and time.
+        self.profile = profile
         simulation_no = 300
         # while len(self._untried_actions) > 0:
         # print(self.get_legal_actions(self.state,self.tile))
-        if not self.get_legal_actions(self.state, self.tile):
+        if not self.get_legal_actions(self.state, self.to_move()):
             return 'pass'
         # for _ in (range(simulation_no)):
+        if endgame_empties and self.state.counts[' '] <= endgame_empties:
+            # the hard limit includes the penalty window allowance: the solver gets the move's normal budget
+            budget = time_limit if clock is None else max(clock.soft - clock.elapsed(), .02)
+            chosen = self.solve_endgame(budget / 2)
+            if chosen is not None:
+                return chosen
+            time_limit = max(time_limit - self.solver.elapsed, .01)  # a positive limit runs one iteration at least
+        if self.table is not None:
+            self.table.newSearch()
+        if clock is not None:
+            # the clock stops a single-process search itself, possibly after buying more time
+            time_limit = float('inf') if workers <= 1 else max(clock.soft - clock.elapsed(), .01)
+        if workers <= 1:
+            self.search(time_limit, batch_size, clock=clock, profile=profile)
+            return self.choose_action()
+        if profile is not None:
+            t, n = perf_counter(), self.n()
+        if parallel == 'tree':
+            from parallel_mcts import treeParallelSearch
+            treeParallelSearch(self, workers, time_limit, self.c_param, epsilon=self.epsilon)
+        else:
+            from parallel_mcts import rootParallelSearch
+            rootParallelSearch(self, workers, time_limit, batch_size)
+        if profile is not None:
+            profile.moves += 1
+            profile.iterations += self.n() - n
+            profile.elapsed += perf_counter() - t
+        return self.choose_action()
+
+    def search(self, time_limit=.1, batch_size=0, stop=None, clock=None, profile=None):
+        # Grows the tree under this node for time_limit seconds, or until the optional threading.Event
+        # 'stop' is set (see ponder) or the optional MoveClock is done (see time_manager). Both are
+        # checked between iterations. An optional search_profile.SearchProfile gets the time of each
+        # phase and the shape of the search.
+        # A batch takes tens of milliseconds, so with batch_size no batch is started that would end
+        # past time_limit (judging by the mean batch time so far).
+        board = self.state
+        undo = []
         t = perf_counter()
-        while (perf_counter() - t) <= .1:
+        batches = 0
+        if profile is not None:
+            profile.moves += 1
+        while (perf_counter() - t) <= time_limit and not (stop is not None and stop.is_set()):
+            if clock is not None and clock.done(self):
+                break
+            if batches and (perf_counter() - t) * (batches + 1) / batches > time_limit:
+                break
+            if self.proven is not None:
+                break  # every move has a known result: nothing left to search
             # print('---------START TREE---------')
-            v = self._tree_policy()
+            if profile is not None:
+                expanding = profile.time['expand']
+                t0 = perf_counter()
+            v = self._tree_policy(board, undo, profile)
             # print('---------PASSOU DA TREE---------')
             # print('---------START ROLLOUT---------')
-            reward = v.rollout()
-            # print('---------PASSOU DO ROLLOUT---------')
-            # print('---------START BACKPRP---------')
-            v.backpropagate(reward)
+            played = len(undo)
+            if profile is not None:
+                t1 = perf_counter()
+                profile.add('select', t1 - t0 - (profile.time['expand'] - expanding))
+                profile.iterations += 1
+                profile.maxDepth = max(profile.maxDepth, v.depth - self.depth)
+                profile.proven += v.proven is not None
+            if v.proven is not None:
+                # a decided node needs no playout: its exact result is backed up, and proven up the tree
+                v.prove()
+                results = {v.proven: batch_size or 1}
+            elif batch_size:
+                # the batch games are not kept, so only the moves of the tree count for AMAF
+                results = v.rollout_batch(board, batch_size, profile)
+                batches += 1
+            else:
+                results = {v.rollout(board, undo): 1}
+                if profile is not None:
+                    profile.rolloutLengths[len(undo) - played] += 1
+                # print('---------PASSOU DO ROLLOUT---------')
+                # print('---------START BACKPRP---------')
+            if profile is not None:
+                t2 = perf_counter()
+                if v.proven is None:
+                    profile.add('rollout', t2 - t1)
+            if self.rave:
+                moves = [(record[0], divmod(record[1], board.sizeY)) for record in undo]
+            for reward, count in results.items():
+                if count:
+                    v.backpropagate(reward, count)
+                    if self.rave:
+                        v.backpropagate_amaf(reward, moves, played, self, count)
+            if profile is not None:
+                profile.add('backpropagate', perf_counter() - t2)
+            while undo:
+                rev.unmake_move(board, undo.pop())
             # print('---------PASSOU BACKPROP---------')
             # for i in self.state:
             #     # print(i)
+        if profile is not None:
+            profile.elapsed += perf_counter() - t
         # print(self.children)
         # if len(self.children) == 0:
         #     self.passes += 1
         #     return 'pass'
-        return self.best_child(c_param=0.)
+
+    def solve_endgame(self, time_limit=None):
+        # Solves the position exactly and returns the chosen child for the best move (as choose_action
+        # does), or None if the solver ran out of time. The solver stays in self.solver for its report.
+        self.solver = EndgameSolver()
+        try:
+            _, move = self.solver.solve(self.state, self.to_move(), self.passes, time_limit)
+        except SolverTimeout:
+            return None
+        return self.choose_action(self.child_for(move))
+
+    def choose_action(self, chosen=None):
+        if chosen is None:
+            chosen = self.best_child(c_param=0.)
+        # the returned node gets its own board so the callers can keep searching from it
+        chosen.state = self.state.copy()
+        rev.makeMove(chosen.state, self.to_move(), chosen.parent_action[0], chosen.parent_action[1])
+        return chosen
+
+    def descendant(self, actions):
+        # The node reached from this one by playing 'actions' ((x, y) or 'pass') in order, or None if the
+        # tree does not have it.
+        node = self
+        for action in actions:
+            action = action if action == 'pass' else tuple(action)
+            node = next((c for c in node.children if c.parent_action == action), None)
+            if node is None:
+                return None
+        return node
+
+    def make_root(self, state, player=None, passes=None):
+        # Promotes this node to the root of the next search on 'state', keeping the statistics gathered
+        # under it. Detaching it from its parent lets the rest of the old tree be garbage-collected.
+        # 'player' and 'passes' default to the node's own. Returns the number of nodes carried over.
+        if not isinstance(state, BitBoard):
+            state = BitBoard.fromBoard(state)
+        self.parent = None
+        self.state = state
+        if player is not None:
+            self.player = player
+        if passes is not None:
+            self.passes = passes
+        tried = {c.parent_action for c in self.children}
+        self._untried_actions = [a for a in self.untried_actions(state, self.tile)
+                                 if (a if a == 'pass' else tuple(a)) not in tried]
+        return self.subtree_size()
+
+    def subtree_size(self):
+        size = 0
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            size += 1
+            stack.extend(node.children)
+        return size
 
     def get_legal_actions(self, state, tile):
         # # print('getting possible moves for ',tile)
@@ -166,8 +507,14 @@ class MonteCarloTreeSearchNode():
         # # print('SHOULD BE PLAYER ',self.player)
         return True if self.passes >= 2 else False
 
+    def final_result(self, state):
+        # Result of a finished game for the side that moved into this node.
+        score = rev.getScoreOfBoard(state)
+        mover = other_tile(self.to_move())
+        return int(np.sign(score[mover] - score[other_tile(mover)]))
+
     def game_result(self, state):
-        temp = gb.get_points(state)
+        temp = rev.getScoreOfBoard(state)  # O(1) on the BitBoard counters
         pt = self.tile
         et = 'X' if pt == 'O' else 'O'
         if temp[pt] > temp[et]:
@@ -178,11 +525,49 @@ class MonteCarloTreeSearchNode():
             return -1  # temp[et] - temp[pt]
 
     def move(self, state, tile, x, y):
-        self.player = not self.player
-        return gb.makeMove(state, tile, x, y)
+        # Plays the move in place and returns its undo record.
+        return rev.make_move(state, tile, x, y)
 
 
 def main():
     root = MonteCarloTreeSearchNode(state=initial_state)
     selected_node = root.best_action()
     return
+
+
+def benchmark_rave(games=20, time_limit=.1, rave=100):
+    # Games of the search with RAVE against the plain search, at the same time per move, with colours
+    # swapped every game. Prints the RAVE side's score and the playouts per move of both.
+    from random import seed
+    points = 0.
+    playouts = {True: 0, False: 0}
+    moves = {True: 0, False: 0}
+    for game in range(games):
+        seed(game)
+        np.random.seed(game)
+        board = BitBoard(stones=[(1, 6), (6, 6)])
+        raveTile = 'X' if game % 2 == 0 else 'O'
+        tile, passes = 'X', 0
+        while passes < 2:
+            withRave = tile == raveTile
+            root = MonteCarloTreeSearchNode(board.copy(), True, None, None, tile, passes=passes,
+                                            rave=rave if withRave else 0)
+            action = root.best_action(time_limit=time_limit)
+            if action == 'pass':
+                passes += 1
+            else:
+                passes = 0
+                playouts[withRave] += root.n()
+                moves[withRave] += 1
+                board.makeMove(tile, action.parent_action[0], action.parent_action[1])
+            tile = other_tile(tile)
+        score = board.getScore()
+        mine, theirs = score[raveTile], score[other_tile(raveTile)]
+        points += 1. if mine > theirs else (.5 if mine == theirs else 0.)
+    print(f'RAVE (rave={rave}) against plain UCT, {time_limit}s per move: {points}/{games} points '
+          f'({100 * points / games:.0f}%), {playouts[True] / max(moves[True], 1):.0f} against '
+          f'{playouts[False] / max(moves[False], 1):.0f} playouts per move')
+
+
+if __name__ == '__main__':
+    benchmark_rave()
@@ -0,0 +1,176 @@
+########################
+# Opening book: the moves of a deep MCTS search for the positions of the first plies of a layout,
+# computed offline by self-play (buildBook) and read by the client from a memory-mapped file.
+# A book belongs to one geometry (size and stones, see geometry.getGeometry): its file name and header
+# hold the layout, so a book is only ever used on the boards it was built for.
+#
+# File format (little-endian): a header
+#   magic 'RVBK', version, sizeX, sizeY, number of stones, capacity, then the (x, y) of every stone
+# followed by 'capacity' (a power of two) slots of RECORD, an open-addressing hash table:
+#   key     Zobrist key of the position (BitBoard.key: discs, side to move, passes), 0 for an empty slot
+#   move    flat square index x*sizeY + y of the book move
+#   visits  playouts of the search that chose it
+# A position is found in its slot (key & (capacity - 1)) or in the following ones (linear probing), so a
+# lookup reads a couple of records whatever the size of the book.
+########################
+
+import argparse
+import mmap
+import os
+import random
+import struct
+from time import perf_counter
+
+from bitboard import BitBoard, otherTile
+from geometry import getGeometry
+
+MAGIC = b'RVBK'
+VERSION = 1
+HEADER = struct.Struct('<4sHHHHI')
+STONE = struct.Struct('<BB')
+RECORD = struct.Struct('<QhI')
+BOOK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'books')
+
+
+def bookPath(geometry, directory=BOOK_DIR):
+    # File of the book of a layout, e.g. books/8x8-1.6-6.6.book
+    stones = '-'.join(f'{x}.{y}' for x, y in geometry.stones) or 'nostones'
+    return os.path.join(directory, f'{geometry.sizeX}x{geometry.sizeY}-{stones}.book')
+
+
+class OpeningBook:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, sizeX, sizeY, stoneCount, self.capacity = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not an opening book (version {VERSION})')
+        stones = [STONE.unpack_from(self.data, HEADER.size + i * STONE.size) for i in range(stoneCount)]
+        self.geometry = getGeometry(sizeX, sizeY, stones)
+        self.offset = HEADER.size + stoneCount * STONE.size
+
+    def close(self):
+        self.data.close()
+
+    def __len__(self):
+        return sum(1 for _ in self.entries())
+
+    def _slot(self, key):
+        # The slot holding 'key', or the empty slot where it would go.
+        mask = self.capacity - 1
+        slot = key & mask
+        while True:
+            stored = RECORD.unpack_from(self.data, self.offset + slot * RECORD.size)
+            if stored[0] == key or stored[0] == 0:
+                return stored
+            slot = (slot + 1) & mask
+
+    def lookup(self, board, tile, passes=0):
+        # ([x, y], visits) of the book move of 'tile' on 'board' (a BitBoard of the book's geometry), or
+        # None if the position is not in the book.
+        key, index, visits = self._slot(board.key(tile, passes))
+        if not key:
+            return None
+        x, y = divmod(index, board.sizeY)
+        if not board.isValidMove(tile, x, y):
+            return None  # a different position with the same key
+        return [x, y], visits
+
+    def entries(self):
+        # (key, move index, visits) of every position in the book.
+        for slot in range(self.capacity):
+            record = RECORD.unpack_from(self.data, self.offset + slot * RECORD.size)
+            if record[0]:
+                yield record
+
+
+_books = {}
+
+
+def openBook(geometry, directory=BOOK_DIR):
+    # The book of a layout, memory-mapped the first time it is asked for, or None if there is none.
+    path = bookPath(geometry, directory)
+    if path not in _books:
+        _books[path] = OpeningBook(path) if os.path.exists(path) else None
+    return _books[path]
+
+
+def writeBook(path, geometry, entries):
+    # Writes {key: (move index, visits)} as a book of 'geometry', with at most half of the slots used.
+    capacity = 1 << max(4, (2 * len(entries) - 1).bit_length())
+    slots = [None] * capacity
+    for key, (index, visits) in entries.items():
+        slot = key & (capacity - 1)
+        while slots[slot] is not None:
+            slot = (slot + 1) & (capacity - 1)
+        slots[slot] = (key, index, visits)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, geometry.sizeX, geometry.sizeY, len(geometry.stones), capacity))
+        for x, y in geometry.stones:
+            f.write(STONE.pack(x, y))
+        for record in slots:
+            f.write(RECORD.pack(*(record or (0, 0, 0))))
+
+
+def buildBook(sizeX=8, sizeY=8, stones=((1, 6), (6, 6)), plies=8, games=50, time_limit=2., explore=.5,
+              directory=BOOK_DIR, seed=0):
+    # Self-play from the initial position of the layout: every position met in the first 'plies' plies is
+    # searched once for time_limit seconds and the chosen move goes into the book. To cover the replies a
+    # client may meet, each side plays a random legal move instead of the book move with probability
+    # 'explore' (the search itself spends nearly all of its playouts on one move). An existing book of the
+    # layout is extended: its positions are not searched again.
+    from mcts import MonteCarloTreeSearchNode
+    random.seed(seed)
+    geometry = getGeometry(sizeX, sizeY, stones)
+    path = bookPath(geometry, directory)
+    entries = {}
+    if os.path.exists(path):
+        book = OpeningBook(path)
+        entries = {key: (index, visits) for key, index, visits in book.entries()}
+        book.close()
+        _books.pop(path, None)
+    print(f'{path}: {len(entries)} positions')
+    t = perf_counter()
+    for game in range(games):
+        board = BitBoard(sizeX, sizeY, stones)
+        tile, passes = 'X', 0
+        for _ in range(plies):
+            moves = board.getValidMoves(tile)
+            if not moves:
+                if passes:
+                    break
+                passes += 1
+                tile = otherTile(tile)
+                continue
+            key = board.key(tile, passes)
+            if key not in entries:
+                root = MonteCarloTreeSearchNode(board.copy(), True, None, None, tile, passes=passes)
+                x, y = root.best_action(time_limit=time_limit, endgame_empties=0).parent_action
+                entries[key] = (x * sizeY + y, root.n())
+            if random.random() < explore:
+                x, y = random.choice(moves)
+            else:
+                x, y = divmod(entries[key][0], sizeY)
+            board.makeMove(tile, x, y)
+            tile, passes = otherTile(tile), 0
+        print(f'game {game + 1}/{games}: {len(entries)} positions, {perf_counter() - t:.0f}s')
+    writeBook(path, geometry, entries)
+    return path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Builds the opening book of a layout by self-play')
+    parser.add_argument('--size', type=int, nargs=2, default=[8, 8], metavar=('X', 'Y'))
+    parser.add_argument('--stones', type=int, nargs='*', default=[1, 6, 6, 6],
+                        help='stone coordinates as x1 y1 x2 y2 ...')
+    parser.add_argument('--plies', type=int, default=8, help='depth of the book')
+    parser.add_argument('--games', type=int, default=50, help='self-play games')
+    parser.add_argument('--time-limit', type=float, default=2., help='search time per book position')
+    parser.add_argument('--explore', type=float, default=.5,
+                        help='probability of a random move instead of the book move in the self-play games')
+    parser.add_argument('--dir', default=BOOK_DIR, help='directory of the books')
+    args = parser.parse_args()
+    stones = list(zip(args.stones[::2], args.stones[1::2]))
+    buildBook(args.size[0], args.size[1], stones, args.plies, args.games, args.time_limit, args.explore, args.dir)
@@ -0,0 +1,332 @@
+########################
+# Parallel MCTS on a pool of worker processes.
+#
+# Root-parallel: N workers grow their own tree from the same root state until the same deadline and
+# send back only the statistics of the root's children.
+# Tree-parallel: N workers grow one tree kept in multiprocessing.shared_memory arrays (NodeStore), using
+# virtual loss during selection and lock-striped updates during backpropagation.
+#
+# Either way the root children statistics are merged into the caller's root before the final
+# best_child(c_param=0.) choice. The pools stay alive across moves (one per worker count) so process
+# startup is paid only once; so does the tree-parallel NodeStore, which is cleared between moves rather
+# than allocated again, and the workers keep it attached.
+########################
+
+import atexit
+import multiprocessing
+import random
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+import reversi as rev
+import greedy_base as gb
+from mcts import MonteCarloTreeSearchNode
+
+LOCK_STRIPES = 64
+
+_pools = {}
+_stores = {}  # owner side: one NodeStore per capacity
+_attached = {}  # worker side: the NodeStores attached to, by segment name
+_locks = None
+
+
+def _setLocks(locks):
+    global _locks
+    _locks = locks
+
+
+def getPool(workers):
+    global _locks
+    pool = _pools.get(workers)
+    if pool is None:
+        if _locks is None:
+            # one lock for node allocation, then the stripes guarding the node statistics
+            _locks = [multiprocessing.Lock() for _ in range(LOCK_STRIPES + 1)]
+        pool = _pools[workers] = multiprocessing.Pool(workers, initializer=_setLocks, initargs=(_locks,))
+    return pool
+
+
+def _ready(_):
+    return True
+
+
+def warmUp(workers):
+    # Starts the pool ahead of the first search, e.g. while waiting for the server, so that the first
+    # move does not lose its budget to process startup.
+    getPool(workers).map(_ready, range(workers))
+
+
+@atexit.register
+def closePools():
+    for pool in _pools.values():
+        pool.terminate()
+    _pools.clear()
+    for store in _stores.values():
+        store.close()
+    _stores.clear()
+
+
+def _searchRoot(args):
+    # Runs in a worker: searches from a fresh root until the deadline and returns, for each root child,
+    # (action, visits, wins, losses, draws).
+    board, tile, player, passes, options, deadline, batch_size, seed = args
+    random.seed(seed)
+    np.random.seed(seed % 2**32)
+    root = MonteCarloTreeSearchNode(board, player, None, None, tile, passes=passes, **options)
+    root.search(deadline - time.time(), batch_size)
+    return [(c.parent_action, c.n(), c._results[1], c._results[-1], c._results[0]) for c in root.children]
+
+
+def rootParallelSearch(root, workers, time_limit=.1, batch_size=0):
+    # Searches 'root' on 'workers' processes and adds the merged child statistics to its own tree.
+    deadline = time.time() + time_limit
+    options = {'rave': root.rave, 'widening': root.widening, 'bias': root.bias, 'c_param': root.c_param,
+               'epsilon': root.epsilon}
+    jobs = [(root.state, root.tile, root.player, root.passes, options, deadline, batch_size, random.getrandbits(64))
+            for _ in range(workers)]
+
+    mergeRootStats(root, getPool(workers).map(_searchRoot, jobs))
+
+
+def mergeRootStats(root, workerStats):
+    # Adds the (action, visits, wins, losses, draws) lists sent by the workers to the children of 'root'.
+    merged = {}
+    for stats in workerStats:
+        for action, visits, wins, losses, draws in stats:
+            total = merged.setdefault(action, [0, 0, 0, 0])
+            total[0] += visits
+            total[1] += wins
+            total[2] += losses
+            total[3] += draws
+
+    for action, (visits, wins, losses, draws) in merged.items():
+        # the workers may have tried a move this tree has not expanded yet
+        child = root.child_for(action)
+        child._number_of_visits += visits
+        child._results[1] += wins
+        child._results[-1] += losses
+        child._results[0] += draws
+        # the root counts its results for the other side
+        root._number_of_visits += visits
+        root._results[1] += losses
+        root._results[-1] += wins
+        root._results[0] += draws
+
+
+class NodeStore:
+    # Tree kept in shared memory so that several processes can grow it together. Node 0 is the root and the
+    # children of a node are contiguous, from first[node] to first[node] + count[node]. 'move' is the flat
+    # square index of the move leading to the node (-1 for a pass). Results are counted from the point
+    # of view of the root's tile. 'state' is 0 for a leaf, 1 while a worker expands it and 2 once expanded.
+    FIELDS = [('visits', np.float64), ('wins', np.float64), ('losses', np.float64), ('draws', np.float64),
+              ('virtual', np.int32), ('first', np.int32), ('count', np.int32), ('move', np.int32),
+              ('state', np.int8)]
+
+    def __init__(self, capacity, name=None):
+        size = 8 + capacity * sum(np.dtype(dtype).itemsize for _, dtype in self.FIELDS)
+        self.capacity = capacity
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)  # new segments are zero-filled
+        elif sys.version_info >= (3, 13):
+            self.shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            # attaching registers the segment with this process' resource tracker, which would then warn
+            # about a leak and unlink it when the worker exits: only the owner manages its lifetime
+            self.shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+        self.used = np.ndarray((1,), dtype=np.int64, buffer=self.shm.buf, offset=0)
+        offset = 8
+        for field, dtype in self.FIELDS:
+            setattr(self, field, np.ndarray((capacity,), dtype=dtype, buffer=self.shm.buf, offset=offset))
+            offset += capacity * np.dtype(dtype).itemsize
+        if self.owner:
+            self.used[0] = 1
+
+    def clear(self):
+        # Empties the tree for a new search, zeroing only the nodes the last one used.
+        used = int(self.used[0])
+        for field, _ in self.FIELDS:
+            getattr(self, field)[:used] = 0
+        self.used[0] = 1
+
+    def close(self):
+        # the arrays are views of the segment: drop them before closing it
+        for field, _ in self.FIELDS:
+            setattr(self, field, None)
+        self.used = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def expand(self, node, moves, sizeY):
+        # Creates the children of 'node' (a single pass child when there is no move). Returns False if
+        # another worker is already expanding it or the store is full.
+        with _locks[1 + node % LOCK_STRIPES]:
+            if self.state[node] != 0:
+                return False
+            self.state[node] = 1
+        with _locks[0]:
+            first = int(self.used[0])
+            count = max(len(moves), 1)
+            if first + count > self.capacity:
+                self.state[node] = 0
+                return False
+            self.used[0] = first + count
+        self.move[first:first + count] = [x * sizeY + y for x, y in moves] if moves else [-1]
+        self.first[node] = first
+        self.count[node] = count
+        self.state[node] = 2
+        return True
+
+    def select(self, node, mine, c_param):
+        # UCT choice among the children of 'node' for the side to move there; 'mine' tells whether that is
+        # the root's tile. Virtual losses count as losses for that side, so workers spread over the tree.
+        first, count = self.first[node], self.count[node]
+        children = slice(first, first + count)
+        virtual = self.virtual[children]
+        n = self.visits[children] + virtual
+        if (n == 0).any():
+            return first + int(np.flatnonzero(n == 0)[0])
+        q = self.wins[children] - self.losses[children]
+        if not mine:
+            q = -q
+        q = q - virtual
+        weights = q / n + c_param * np.sqrt(2 * np.log(n.sum()) / n)
+        return first + int(np.argmax(weights))
+
+    def addVirtual(self, node, amount):
+        with _locks[1 + node % LOCK_STRIPES]:
+            self.virtual[node] += amount
+
+    def update(self, node, result):
+        with _locks[1 + node % LOCK_STRIPES]:
+            self.virtual[node] -= 1
+            self.visits[node] += 1
+            if result == 1:
+                self.wins[node] += 1
+            elif result == -1:
+                self.losses[node] += 1
+            else:
+                self.draws[node] += 1
+
+
+def _otherTile(tile):
+    return 'O' if tile == 'X' else 'X'
+
+
+def _treeWorker(args):
+    # Runs in a worker: selection, expansion, playout and backpropagation on the shared tree until the
+    # deadline. Returns the number of playouts done.
+    name, capacity, board, rootTile, toMove, passes, deadline, c_param, epsilon, seed = args
+    random.seed(seed)
+    store = _attached.get(name)
+    if store is None:
+        store = _attached[name] = NodeStore(capacity, name)
+    sizeY = board.sizeY
+    playouts = 0
+    while time.time() < deadline:
+        node, tile, p = 0, toMove, passes
+        path = [0]
+        undo = []
+        store.addVirtual(0, 1)
+        while p < 2:
+            if store.state[node] != 2:
+                # a leaf: expand it on its second visit, otherwise play out from it
+                if store.visits[node] + store.virtual[node] < 2 or \
+                        not store.expand(node, board.getValidMoves(tile), sizeY):
+                    break
+            node = store.select(node, tile == rootTile, c_param)
+            move = int(store.move[node])
+            if move < 0:
+                p += 1
+            else:
+                p = 0
+                undo.append(rev.make_move(board, tile, move // sizeY, move % sizeY))
+            tile = _otherTile(tile)
+            path.append(node)
+            store.addVirtual(node, 1)
+        result = gb.greedyPlayout(board, tile, p, rootTile, undo, epsilon)
+        for node in path:
+            store.update(node, result)
+        while undo:
+            rev.unmake_move(board, undo.pop())
+        playouts += 1
+    return playouts
+
+
+def treeParallelSearch(root, workers, time_limit=.1, c_param=.1, capacity=1 << 18, epsilon=.1):
+    # Searches 'root' with 'workers' processes sharing one tree and adds the statistics of the shared
+    # root's children to its own tree. c_param is the UCT constant of the selection and epsilon that of
+    # the greedy playouts. Returns the number of playouts done.
+    deadline = time.time() + time_limit
+    board = root.state
+    toMove = root.tile if root.player else _otherTile(root.tile)
+    store = _stores.get(capacity)
+    if store is None:
+        store = _stores[capacity] = NodeStore(capacity)
+    else:
+        store.clear()
+    pool = getPool(workers)  # creates the locks the master needs to expand the shared root
+    store.expand(0, board.getValidMoves(toMove), board.sizeY)
+    jobs = [(store.shm.name, capacity, board, toMove, toMove, root.passes, deadline, c_param, epsilon,
+             random.getrandbits(64)) for _ in range(workers)]
+    playouts = sum(pool.map(_treeWorker, jobs))
+
+    first, count = store.first[0], store.count[0]
+    stats = []
+    for child in range(first, first + count):
+        if store.move[child] >= 0 and store.visits[child]:
+            move = int(store.move[child])
+            stats.append(((move // board.sizeY, move % board.sizeY), int(store.visits[child]),
+                          int(store.wins[child]), int(store.losses[child]), int(store.draws[child])))
+    mergeRootStats(root, [stats])
+    return playouts
+
+
+def benchmark(workers=4, games=4, time_limit=.1):
+    # Playouts per second and result against the greedy player of the single-process, root-parallel and
+    # tree-parallel searches, at the same time budget per move.
+    from bitboard import BitBoard
+    for mode in ('single', 'root', 'tree'):
+        playouts = 0
+        searched = 0
+        points = 0
+        for game in range(games):
+            board = BitBoard(stones=[(1, 6), (6, 6)])
+            mctsTile = 'X' if game % 2 == 0 else 'O'
+            tile, passes = 'X', 0
+            while passes < 2:
+                if tile == mctsTile:
+                    root = MonteCarloTreeSearchNode(board.copy(), True, None, None, tile)
+                    if mode == 'tree' and root.get_legal_actions(root.state, tile):
+                        playouts += treeParallelSearch(root, workers, time_limit, root.c_param,
+                                                       epsilon=root.epsilon)
+                        searched += time_limit
+                        move = root.choose_action().parent_action
+                    else:
+                        action = root.best_action(time_limit=time_limit, workers=workers if mode == 'root' else 1)
+                        if action != 'pass':
+                            playouts += root.n()
+                            searched += time_limit
+                        move = None if action == 'pass' else action.parent_action
+                else:
+                    move = gb.chooseGreedyMove(board, tile)
+                if move is None:
+                    passes += 1
+                else:
+                    passes = 0
+                    board.makeMove(tile, move[0], move[1])
+                tile = _otherTile(tile)
+            score = board.getScore()
+            mine, theirs = score[mctsTile], score[_otherTile(mctsTile)]
+            points += 1 if mine > theirs else (.5 if mine == theirs else 0)
+        print(f'{mode:6s}: {playouts / max(searched, 1e-9):9.1f} playouts/s, {points}/{games} points against greedy')
+
+
+if __name__ == '__main__':
+    import sys
+    benchmark(workers=int(sys.argv[1]) if len(sys.argv) > 1 else 4)
@@ -6,6 +6,7 @@
 # Modificado a partir de: https://inventwithpython.com/chapter15.html
 ########################
 
+import argparse
 import sys
 
 import reversi as rev
@@ -13,6 +14,9 @@ from greedy_base import chooseGreedyMove,chooseMSCTMove
 import greedy_base as gb
 
 from mcts import MonteCarloTreeSearchNode
+from transposition import TranspositionTable
+from time_manager import TimeManager
+from endgame import ENDGAME_EMPTIES
 
 
 
@@ -84,7 +88,24 @@ def showPoints(board, playerTile, computerTile):
     print('You have %s points. The computer has %s points.' % (scores[playerTile], scores[computerTile]))
 
 
-def PLAY_GAME():
+def nextRoot(root, action, board, tile, passes, table=None, rave=0, widening=0, bias=0):
+    # Root of the next MCTS search, after the computer's 'action' ((x, y) or 'pass') on 'board'. 'root' is
+    # the node of the MCTS player's last move ('pass' if it passed): as in client_mcts, the subtree of the
+    # action is reused if the search explored it, otherwise the search starts from a new tree.
+    reused = root.descendant([action]) if root != 'pass' else None
+    if reused is not None:
+        reused.make_root(board, passes=passes)
+        return reused
+    return MonteCarloTreeSearchNode(board, player=True, tile=tile, table=table, passes=passes, rave=rave,
+                                    widening=widening, bias=bias)
+
+
+def PLAY_GAME(workers=1, parallel='root', tt_size=1 << 16, max_time=None, penalty_budget=0,
+              endgame_empties=ENDGAME_EMPTIES, rave=0, widening=0, bias=0):
+    manager = TimeManager(max_time, penalty_budget=penalty_budget) if max_time else None
+    if workers > 1:
+        from parallel_mcts import warmUp
+        warmUp(workers)
     print('Welcome to Reversi!')
     JOGADAS = 1
     while True:
@@ -102,7 +123,10 @@ def PLAY_GAME():
 
         turn = 'player' if (playerTile == 'X') else 'computer'  # player with 'X' starts
         print('The ' + turn + ' will go first.')
-        root = MonteCarloTreeSearchNode(mainBoard,tile=playerTile)
+        table = TranspositionTable(tt_size) if tt_size else None
+        if manager is not None:
+            manager.newGame()
+        root = MonteCarloTreeSearchNode(mainBoard,tile=playerTile, table=table, rave=rave, widening=widening, bias=bias)
         while True:
             # O jogo acabe depois de dois "pass" consecutivos
             if root != 'pass':
@@ -120,7 +144,10 @@ def PLAY_GAME():
                 else:
                     rev.drawBoard(mainBoard)
                 showPoints(mainBoard, playerTile, computerTile)
-                root = root.best_action()
+                clock = manager.startMove(root.state, playerTile) if manager is not None else None
+                root = root.best_action(workers=workers, parallel=parallel, clock=clock, endgame_empties=endgame_empties)
+                if clock is not None:
+                    manager.finish(clock)
                 if root != 'pass':
                     move = root.parent_action
                 else:
@@ -150,15 +177,15 @@ def PLAY_GAME():
 
                 if rev.getValidMoves(mainBoard, computerTile) == []:
                     passCount += 1
-                    root.passes += 1
+                    action = 'pass'
                     print("Computer passed.")
                 else:
                     passCount = 0
                     x, y = chooseGreedyMove(mainBoard, computerTile, epsilon=-1)
                     mainBoard = gb.makeMove(mainBoard, computerTile, x, y)
+                    action = (x, y)
                     print("Computer played x =", x, "y =", y)
-                # root.state = mainBoard
-                root = MonteCarloTreeSearchNode(mainBoard,player=True,tile=playerTile, parent=root, parent_action=root.parent_action)
+                root = nextRoot(root, action, mainBoard, playerTile, passCount, table, rave, widening, bias)
                 turn = 'player'
                 # JOGADAS += 1
 
@@ -167,6 +194,10 @@ def PLAY_GAME():
         scores = rev.getScoreOfBoard(mainBoard)
         print('X scored %s points. O scored %s points.' % (scores['X'], scores['O']))
         
+        if manager is not None and manager.moves:
+            print('MCTS thought %.2fs per move, for %s penalty points under the server rules.'
+                  % (manager.searched / manager.moves, manager.spent))
+
         if scores[playerTile] > scores[computerTile]:
             print('You beat the computer by %s points! Congratulations!' % (scores[playerTile] - scores[computerTile]))
         elif scores[playerTile] < scores[computerTile]:
@@ -179,7 +210,12 @@ def PLAY_GAME():
 
 from random import choice,randint
 
-def PLAY_GAME_AUTO():
+def PLAY_GAME_AUTO(workers=1, parallel='root', tt_size=1 << 16, max_time=None, penalty_budget=0,
+                   endgame_empties=ENDGAME_EMPTIES, rave=0, widening=0, bias=0):
+    manager = TimeManager(max_time, penalty_budget=penalty_budget) if max_time else None
+    if workers > 1:
+        from parallel_mcts import warmUp
+        warmUp(workers)
     # print('Welcome to auto Reversi!')
     JOGADAS = 1
     wins = 0
@@ -204,7 +240,11 @@ def PLAY_GAME_AUTO():
 
         turn = 'player' if (playerTile == 'X') else 'computer'  # player with 'X' starts
         # print('The ' + turn + ' will go first.')
-        root = MonteCarloTreeSearchNode(mainBoard,tile=playerTile, is_simulation=False)
+        table = TranspositionTable(tt_size) if tt_size else None
+        if manager is not None:
+            manager.newGame()
+        root = MonteCarloTreeSearchNode(mainBoard,tile=playerTile, is_simulation=False, table=table, rave=rave,
+                                        widening=widening, bias=bias)
         while True:
             # O jogo acabe depois de dois "pass" consecutivos
             if root != 'pass':
@@ -222,7 +262,10 @@ def PLAY_GAME_AUTO():
                 # else:
                 #     rev.drawBoard(mainBoard)
                 # showPoints(mainBoard, playerTile, computerTile)
-                root = root.best_action()
+                clock = manager.startMove(root.state, playerTile) if manager is not None else None
+                root = root.best_action(workers=workers, parallel=parallel, clock=clock, endgame_empties=endgame_empties)
+                if clock is not None:
+                    manager.finish(clock)
                 if root != 'pass':
                     move = root.parent_action
                 else:
@@ -252,15 +295,15 @@ def PLAY_GAME_AUTO():
 
                 if rev.getValidMoves(mainBoard, computerTile) == []:
                     passCount += 1
-                    root.passes += 1
+                    action = 'pass'
                     # print("Computer passed.")
                 else:
                     passCount = 0
                     x, y = chooseGreedyMove(mainBoard, computerTile)
                     mainBoard = gb.makeMove(mainBoard, computerTile, x, y)
+                    action = (x, y)
                     # print("Computer played x =", x, "y =", y)
-                # root.state = mainBoard
-                root = MonteCarloTreeSearchNode(mainBoard,player=True,tile=playerTile, parent=root, parent_action=root.parent_action)
+                root = nextRoot(root, action, mainBoard, playerTile, passCount, table, rave, widening, bias)
                 turn = 'player'
                 # JOGADAS += 1
 
@@ -288,5 +331,27 @@ def PLAY_GAME_AUTO():
 ### ENTRY POINT ###
 
 if __name__ == '__main__':
-    PLAY_GAME_AUTO()
+    parser = argparse.ArgumentParser(description='MCTS against the greedy player, offline')
+    parser.add_argument('--workers', type=int, default=1, help='processes used by the parallel search')
+    parser.add_argument('--parallel', choices=['root', 'tree'], default='root',
+                        help='root-parallel (one tree per worker) or tree-parallel (one shared tree) search')
+    parser.add_argument('--tt-size', type=int, default=1 << 16,
+                        help='transposition table entries per game (0 turns it off)')
+    parser.add_argument('--max-time', type=float, default=None, metavar='SECONDS',
+                        help='let the time manager budget each move, up to SECONDS when it matters')
+    parser.add_argument('--penalty-budget', type=int, default=0,
+                        help='penalty points per game the time manager may spend on unsettled positions')
+    parser.add_argument('--endgame-empties', type=int, default=ENDGAME_EMPTIES,
+                        help='solve the position exactly from this many empty squares (0 turns it off)')
+    parser.add_argument('--rave', type=float, default=0,
+                        help='RAVE equivalence parameter: visits at which the AMAF and UCT means weigh the same '
+                             '(0 turns RAVE off)')
+    parser.add_argument('--widening', type=float, default=0,
+                        help='progressive widening: a node gets 1 + WIDENING * sqrt(visits) children (0 turns it off)')
+    parser.add_argument('--bias', type=float, default=0,
+                        help='weight of the move priors in the selection (progressive bias, 0 turns it off)')
+    args = parser.parse_args()
+    PLAY_GAME_AUTO(workers=args.workers, parallel=args.parallel, tt_size=args.tt_size,
+                   max_time=args.max_time, penalty_budget=args.penalty_budget, endgame_empties=args.endgame_empties,
+                   rave=args.rave, widening=args.widening, bias=args.bias)
 
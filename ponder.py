@@ -0,0 +1,50 @@
+########################
+# Pondering: searching while the adversary thinks.
+# After our move the client would otherwise sit in receiveMsg until the reply arrives. A Ponderer uses that
+# time in a background thread: it keeps growing the tree below the node of our move, where the adversary is
+# to play, so the subtrees of its likely replies get the playouts. When the reply arrives the thread is
+# stopped and the subtree of that reply is handed to the next best_action.
+#
+# A thread is enough here: the main thread spends the whole time blocked on the socket, which releases the
+# GIL, so the search gets the CPU to itself.
+########################
+
+import threading
+
+
+class Ponderer:
+    def __init__(self, node, batch_size=0):
+        # 'node' is the node of our last move (as returned by best_action, with its board in 'state').
+        # It becomes the root of its own tree, so the pondering playouts stop there.
+        node.make_root(node.state)
+        self.root = node
+        self.batch_size = batch_size
+        self._before = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        if not self.root.is_terminal_node() and self.root.proven is None:
+            self._before = {child.parent_action: child.n() for child in self.root.children}
+            if self.root.table is not None:
+                self.root.table.newSearch()
+            self._thread.start()
+        return self
+
+    def _run(self):
+        self.root.search(float('inf'), self.batch_size, stop=self._stop)
+
+    def stop(self):
+        # Stops the search (at the end of the current iteration) and waits for the thread.
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def take(self, action):
+        # Stops pondering and returns the subtree of the adversary's 'action' ((x, y) or 'pass') and the
+        # number of playouts pondering added to it, or (None, 0) if the tree does not have that reply.
+        self.stop()
+        node = self.root.descendant([action])
+        if node is None:
+            return None, 0
+        return node, node.n() - self._before.get(node.parent_action, 0)
@@ -3,9 +3,13 @@
 # Baseado em código disponível em: https://inventwithpython.com/chapter15.html
 ########################
 
+from bitboard import BitBoard
+
 
 def drawBoard(board):
     # This function prints out the board that it was passed. Returns None.
+    if isinstance(board, BitBoard):
+        board = board.toBoard()
     HLINE  = '   +' + ('---+' * len(board))
     #VLINE = '   |' + ('   |' * len(board))
 
@@ -56,47 +60,12 @@ def getNewBoard(sizeX=8, sizeY=8, stones=[]):
 def isValidMove(board, tile, xstart, ystart):
     # Returns False if the player's move on space xstart, ystart is invalid.
     # If it is a valid move, returns a list of spaces that would become the player's if they made a move here.
+    # Accepts either a list-of-lists board or a BitBoard; the flips are computed by the bitboard engine.
+    if isinstance(board, BitBoard):
+        return board.isValidMove(tile, xstart, ystart)
     if not isOnBoard(board, xstart, ystart) or board[xstart][ystart] != ' ':
         return False
-    board[xstart][ystart] = tile # temporarily set the tile on the board.
-
-    if tile == 'X':
-        otherTile = 'O'
-    else:
-        otherTile = 'X'
-
-    tilesToFlip = []
-    for xdirection, ydirection in [[0, 1], [1, 1], [1, 0], [1, -1], [0, -1], [-1, -1], [-1, 0], [-1, 1]]:
-        x, y = xstart, ystart
-        x += xdirection # first step in the direction
-        y += ydirection # first step in the direction
-        if isOnBoard(board, x, y) and board[x][y] == otherTile:
-            # There is a piece belonging to the other player next to our piece.
-            x += xdirection
-            y += ydirection
-            if not isOnBoard(board, x, y):
-                continue
-            while board[x][y] == otherTile:
-                x += xdirection
-                y += ydirection
-                if not isOnBoard(board, x, y): # break out of while loop, then continue in for loop
-                    break
-            if not isOnBoard(board, x, y):
-                continue
-            if board[x][y] == tile:
-                # There are pieces to flip over. Go in the reverse direction until we reach the original space, noting all the tiles along the way.
-                while True:
-                    x -= xdirection
-                    y -= ydirection
-                    if x == xstart and y == ystart:
-                        break
-                    tilesToFlip.append([x, y])
-
-    board[xstart][ystart] = ' ' # restore the empty space
-    if len(tilesToFlip) == 0: # If no tiles were flipped, this is not a valid move.
-        return False
-
-    return tilesToFlip
+    return BitBoard.fromBoard(board).flipsList(tile, xstart * len(board[0]) + ystart) or False
 
 
 def isOnBoard(board, x, y):
@@ -106,30 +75,28 @@ def isOnBoard(board, x, y):
 
 def getValidMoves(board, tile):
     # Returns a list of [x,y] lists of valid moves for the given player on the given board.
-    validMoves = []
-    for x in range(len(board)):
-        for y in range(len(board[0])):
-            if isValidMove(board, tile, x, y) != False:
-                validMoves.append([x, y])
-    return validMoves
+    if not isinstance(board, BitBoard):
+        board = BitBoard.fromBoard(board)
+    return board.getValidMoves(tile)
 
 
 def getScoreOfBoard(board):
     # Determine the score by counting the tiles. Returns a dictionary with keys 'X' and 'O'.
+    if isinstance(board, BitBoard):
+        return board.getScore()
     xscore = 0
     oscore = 0
-    for x in range(len(board)):
-        for y in range(len(board[0])):
-            if board[x][y] == 'X':
-                xscore += 1
-            if board[x][y] == 'O':
-                oscore += 1
+    for column in board:
+        xscore += column.count('X')
+        oscore += column.count('O')
     return {'X':xscore, 'O':oscore}
 
 
 def makeMove(board, tile, xstart, ystart):
     # Place the tile on the board at xstart, ystart, and flip any of the opponent's pieces.
     # Returns False if this is an invalid move, True if it is valid.
+    if isinstance(board, BitBoard):
+        return board.makeMove(tile, xstart, ystart)
     tilesToFlip = isValidMove(board, tile, xstart, ystart)
     if tilesToFlip == False:
         return False
@@ -139,8 +106,34 @@ def makeMove(board, tile, xstart, ystart):
     return True
 
 
+def make_move(board, tile, xstart, ystart):
+    # Same as makeMove, but returns an undo record for unmake_move instead of True (False if the move is invalid).
+    if isinstance(board, BitBoard):
+        return board.make_move(tile, xstart, ystart)
+    tilesToFlip = isValidMove(board, tile, xstart, ystart)
+    if tilesToFlip == False:
+        return False
+    board[xstart][ystart] = tile
+    for x, y in tilesToFlip:
+        board[x][y] = tile
+    return (tile, [xstart, ystart], tilesToFlip)
+
+
+def unmake_move(board, undo):
+    # Reverts a move played by make_move.
+    if isinstance(board, BitBoard):
+        return board.unmake_move(undo)
+    tile, (xstart, ystart), tilesToFlip = undo
+    otherTile = 'O' if tile == 'X' else 'X'
+    board[xstart][ystart] = ' '
+    for x, y in tilesToFlip:
+        board[x][y] = otherTile
+
+
 def getBoardCopy(board):
     # Make a duplicate of the board list and return the duplicate.
+    if isinstance(board, BitBoard):
+        return board.copy()
     dupeBoard = getNewBoard(sizeX=len(board), sizeY=len(board[0]))
     for x in range(len(board)):
         for y in range(len(board[0])):
@@ -150,7 +143,7 @@ def getBoardCopy(board):
 
 def getBoardWithValidMoves(board, tile):
     # Returns a new board with . marking the valid moves the given player can make.
-    dupeBoard = getBoardCopy(board)
+    dupeBoard = board.toBoard() if isinstance(board, BitBoard) else getBoardCopy(board)
     for x, y in getValidMoves(dupeBoard, tile):
         dupeBoard[x][y] = '.'
     return dupeBoard
@@ -0,0 +1,63 @@
+########################
+# Search profile: where the time of an MCTS search goes. Given to best_action (or search), a SearchProfile
+# is filled by the single-process search with, per phase, the number of calls and the time spent:
+#   select         descending the tree (_tree_policy, without the expansion)
+#   expand         creating the new node
+#   rollout        the playouts (or, for a proven node, nothing: it is counted in 'proven')
+#   backpropagate  updating the statistics on the path, AMAF included
+# and with the shape of the search: iterations, deepest node reached (below the root), nodes created and
+# the histogram of rollout lengths in moves. The search only looks at the profile when it is given one,
+# so without it the cost is one test per phase.
+########################
+
+from collections import Counter
+
+PHASES = ('select', 'expand', 'rollout', 'backpropagate')
+
+
+class SearchProfile:
+    def __init__(self):
+        self.iterations = 0
+        self.calls = dict.fromkeys(PHASES, 0)
+        self.time = dict.fromkeys(PHASES, 0.)
+        self.elapsed = 0.
+        self.maxDepth = 0
+        self.nodes = 0
+        self.proven = 0
+        self.rolloutLengths = Counter()
+        self.moves = 0  # searches (moves) added up in the profile
+
+    def add(self, phase, seconds):
+        self.calls[phase] += 1
+        self.time[phase] += seconds
+
+    def merge(self, other):
+        # Adds the counts of another profile, e.g. to report on several moves at once.
+        self.iterations += other.iterations
+        for phase in PHASES:
+            self.calls[phase] += other.calls[phase]
+            self.time[phase] += other.time[phase]
+        self.elapsed += other.elapsed
+        self.maxDepth = max(self.maxDepth, other.maxDepth)
+        self.nodes += other.nodes
+        self.proven += other.proven
+        self.rolloutLengths.update(other.rolloutLengths)
+        self.moves += other.moves
+        return self
+
+    def meanRolloutLength(self):
+        rollouts = sum(self.rolloutLengths.values())
+        return sum(length * n for length, n in self.rolloutLengths.items()) / rollouts if rollouts else 0.
+
+    def toDict(self):
+        return {'moves': self.moves, 'iterations': self.iterations, 'elapsed': self.elapsed,
+                'calls': dict(self.calls), 'time': dict(self.time), 'maxDepth': self.maxDepth, 'nodes': self.nodes,
+                'proven': self.proven, 'rolloutLengths': dict(sorted(self.rolloutLengths.items()))}
+
+    def summary(self):
+        # One line: iterations, their rate, the share of each phase in the search time, and the tree.
+        elapsed = max(self.elapsed, 1e-9)
+        phases = ' '.join(f'{phase} {100 * self.time[phase] / elapsed:.0f}%' for phase in PHASES)
+        return (f'{self.iterations} iterations in {self.elapsed:.2f}s ({self.iterations / elapsed:.0f}/s), {phases}, '
+                f'max depth {self.maxDepth}, {self.nodes} nodes, {self.proven} proven, '
+                f'rollouts of {self.meanRolloutLength():.1f} moves')
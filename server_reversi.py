@@ -3,6 +3,7 @@ import time
 import json
 
 import reversi as rev
+from bitboard import BitBoard
 
 
 class Player:
@@ -131,7 +132,8 @@ def receiveValidMoveMsg(player, board):
 
 def serve_match(playerX, playerO, dict_board_params, overall_results):
     showHints = True
-    board = rev.getNewBoard(**dict_board_params)
+    # a BitBoard keeps running disc counts, so printScore does not rescan the board every ply
+    board = BitBoard(**dict_board_params)
 
     # envia tabuleiro e peças de cada player
     sendMsg(playerX, board_to_message(dict_board_params))
@@ -0,0 +1,153 @@
+########################
+# Time management for the MCTS player.
+# server_reversi.receiveValidMoveMsg charges one penalty point per full 3 s spent on a move, and starts its
+# clock 0.1 s early. Every move gets its own window, so a move that ends before 2.9 s is free. A move
+# that runs past that costs a point whether it ends at 3 s or at 5.8 s.
+#
+# A TimeManager gives each move a soft and a hard limit:
+#  - the soft limit is the normal budget. It comes from max_time and is cut down when the decision matters
+#    less: few legal moves (nothing to think about with one), the opening, and the last empty squares.
+#  - the hard limit is the end of the free window, minus a safety margin for the message round trip.
+# At every check the search stops early once the best root child cannot be overtaken by the playouts
+# left until the current limit (with one legal move, at once), ranking the children as the final choice
+# does. After the soft limit it also stops once the best child has stayed the same for the last quarter of
+# the move. If it is still changing at the hard limit and penalty_budget allows, the move buys the next
+# 3 s window: that point is then spent on purpose, on an unsettled position.
+########################
+
+from math import sqrt
+from time import perf_counter
+
+PENALTY_WINDOW = 3.  # one point per full window spent on a move
+PENALTY_GRACE = .1   # the server starts its clock this much before it waits for the move
+
+
+def penaltyFor(elapsed):
+    # Points the server charges for a move that took 'elapsed' seconds on our side.
+    return int((elapsed + PENALTY_GRACE) / PENALTY_WINDOW)
+
+
+class TimeManager:
+    def __init__(self, max_time=1., margin=.3, penalty_budget=0, check_interval=.02):
+        # max_time: budget of a move that matters (capped to the free window)
+        # margin: kept free before each window ends, for the round trip and printing
+        # penalty_budget: points per game that may be spent to keep searching unsettled positions
+        self.max_time = max_time
+        self.margin = margin
+        self.penalty_budget = penalty_budget
+        self.check_interval = check_interval
+        self.newGame()
+
+    def newGame(self):
+        self.spent = 0
+        self.moves = 0
+        self.searched = 0.
+
+    def windowEnd(self, points=0):
+        # Latest time a move can end while costing 'points' penalty points.
+        return (points + 1) * PENALTY_WINDOW - PENALTY_GRACE - self.margin
+
+    def softLimit(self, empties, size, legal):
+        if legal <= 1:
+            return 0.
+        # opening positions are much alike and the last squares are played out exactly by the rollouts,
+        # so both get less than the middle game
+        played = 1 - empties / size
+        phase = .6 if played < .25 else min(1., max(.3, empties / 16))
+        branching = min(1., sqrt(legal / 6))
+        return min(self.max_time, self.windowEnd()) * phase * branching
+
+    def startMove(self, board, tile, started=None):
+        # Returns the MoveClock of a move of 'tile' on 'board'. 'started' is the perf_counter() value when
+        # the server started waiting for the move (by default now), e.g. taken right after the adversary's
+        # move was received.
+        legal = len(board.getValidMoves(tile))
+        size = board.sizeX * board.sizeY - board.geometry.stoneCount
+        soft = self.softLimit(board.counts[' '], size, legal)
+        return MoveClock(self, soft, started)
+
+    def finish(self, clock):
+        # Records the move once it is sent and returns the penalty points it cost.
+        elapsed = clock.elapsed()
+        points = penaltyFor(elapsed)
+        self.spent += points
+        self.moves += 1
+        self.searched += elapsed
+        return points
+
+
+class MoveClock:
+    def __init__(self, manager, soft, started=None):
+        self.manager = manager
+        self.started = perf_counter() if started is None else started
+        self.soft = soft
+        self.tier = 0
+        self.hard = max(soft, manager.windowEnd())
+        self.best = None
+        self.bestSince = 0.
+        self.nextCheck = 0.
+        self.reason = None
+
+    def elapsed(self):
+        return perf_counter() - self.started
+
+    def remaining(self):
+        return max(0., self.hard - self.elapsed())
+
+    def done(self, root):
+        # Called by the search between iterations: True once the move should be played.
+        elapsed = self.elapsed()
+        if elapsed < self.nextCheck or not any(c.n() for c in root.children):
+            return False
+        self.nextCheck = elapsed + self.manager.check_interval
+
+        best = root.best_child(c_param=0.)
+        if best is not self.best:
+            self.best = best
+            self.bestSince = elapsed
+
+        # playouts still to come before the current limit, at the rate seen so far
+        limit = self.soft if elapsed < self.soft else self.hard
+        left = root.n() / max(elapsed, 1e-3) * max(0., limit - elapsed)
+        if self.cannotBeOvertaken(root, best, left):
+            return self._stop('settled', True)
+        if elapsed < self.soft:
+            return False
+
+        if elapsed - self.bestSince >= elapsed / 4:
+            return self._stop('stable', True)
+        if elapsed >= self.hard:
+            if self.manager.spent + self.tier < self.manager.penalty_budget:
+                self.tier += 1
+                self.hard = self.manager.windowEnd(self.tier)
+                return False
+            return self._stop('hard', True)
+        return False
+
+    def _stop(self, reason, stop):
+        if stop:
+            self.reason = reason
+        return stop
+
+    @staticmethod
+    def reach(root, child, left, result):
+        # What best_child(c_param=0.) would rank 'child' at after 'left' more playouts, all ending in
+        # 'result' (1 or -1) for it: a proven result does not move, and with RAVE its AMAF mean moves too.
+        if child.proven is not None:
+            return 2 * child.proven
+        n = child.n() + left
+        mean = (child.q() + result * left) / n
+        if not root.rave or not child.amaf_visits:
+            return mean
+        beta = sqrt(root.rave / (3 * n + root.rave))
+        return (1 - beta) * mean + beta * (child.amaf_q + result * left) / (child.amaf_visits + left)
+
+    @classmethod
+    def cannotBeOvertaken(cls, root, best, left):
+        # True if no other child can reach the best child's rank in the final choice, even if the 'left'
+        # playouts turn the best child's results into losses and another child's into wins. A legal move
+        # without a child yet could still turn out to be a win, so it always could.
+        if not root.is_fully_expanded():
+            return False
+        worst = cls.reach(root, best, left, -1)
+        return all(cls.reach(root, c, left, 1) < worst for c in root.children if c is not best)
@@ -0,0 +1,383 @@
+########################
+# Tournament server: the protocol of server_reversi for any number of clients, on one asyncio event loop.
+# Clients connect to the usual port and are asked their name ("name?"). Once enough of them have joined
+# (--players, or no new client for --wait seconds) they are paired
+#   roundrobin  every client meets every other one (circle method: n - 1 rounds, a bye for an odd count)
+#   swiss       --rounds rounds, each pairing clients with the same points who have not met yet
+# and every pairing plays --games matches with alternating colours. All the pairings of a round are served
+# at the same time, each by its own serve_match coroutine; a client only ever plays one match at a time,
+# so for a client the conversation is exactly the one of server_reversi and the clients work unchanged.
+#
+# The protocol has no framing: a client reads a message with a single recv, and two messages that reach
+# it back to back arrive glued together (e.g. "ok" and a fast adversary's move). Every connection therefore
+# waits MESSAGE_GAP seconds between two messages it sends, which costs a match nothing but latency.
+# A client that disconnects loses its match as if it had sent too many invalid moves (a 100 point penalty)
+# and every later match by forfeit.
+########################
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import socket
+
+import reversi as rev
+from bitboard import BitBoard
+from server_reversi import board_to_message
+
+PORT = 5123
+MESSAGE_GAP = .05  # seconds between two messages to the same client
+BOARD_PARAM = dict(sizeX=8, sizeY=8, stones=[(1, 6), (6, 6)])
+PAIRING_STEPS = 10000  # steps of the search for a Swiss round without rematches
+
+
+class Client:
+    # A connection and what the tournament knows about its player.
+    def __init__(self, name, reader, writer):
+        self.name = name
+        self.reader = reader
+        self.writer = writer
+        self.connected = True
+        self.lastSent = 0.
+        self.piece = '-'
+        self.penalty = 0
+        self.points = 0.
+        self.wins = self.draws = self.losses = 0
+        self.whites = 0  # matches played with X minus matches played with O
+        self.opponents = []
+        self.bye = False
+
+    async def send(self, msg):
+        loop = asyncio.get_running_loop()
+        wait = self.lastSent + MESSAGE_GAP - loop.time()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        try:
+            self.writer.write(msg.encode())
+            await self.writer.drain()
+        except (ConnectionError, OSError) as exc:
+            self.connected = False
+            raise ConnectionResetError(f'{self.name} disconnected') from exc
+        self.lastSent = loop.time()
+
+    async def receive(self):
+        try:
+            msg = await self.reader.read(128)
+        except (ConnectionError, OSError):
+            msg = b''
+        if not msg:
+            self.connected = False
+            raise ConnectionResetError(f'{self.name} disconnected')
+        return msg.decode().strip()
+
+    def record(self, opponent, score):
+        self.points += score
+        self.wins += score == 1
+        self.draws += score == .5
+        self.losses += score == 0
+        self.opponents.append(opponent.name)
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+
+async def receiveValidMoveMsg(player, board):
+    # The move of 'player' ((x, y) or 'pass'), 'abort' after two invalid ones, with its thinking time
+    # charged as in server_reversi.
+    loop = asyncio.get_running_loop()
+    start_time = loop.time() - 0.1  # to give +0.1s due to loss of time in overhead
+    for trials in range(2):
+        moveMsg = await player.receive()
+        if moveMsg == 'pass':
+            player.penalty += int((loop.time() - start_time) / 3)
+            return moveMsg
+        moveMsg = moveMsg.split()
+        try:
+            moveX, moveY = int(moveMsg[0]), int(moveMsg[1])
+            wellFormattedMsg = len(moveMsg) == 2
+        except (ValueError, IndexError):
+            wellFormattedMsg = False
+        if wellFormattedMsg and rev.isValidMove(board, player.piece, moveX, moveY):
+            player.penalty += int((loop.time() - start_time) / 3)
+            return (moveX, moveY)
+        await player.send("invalid")
+    return 'abort'
+
+
+async def serve_match(playerX, playerO, dict_board_params, label=''):
+    # Plays one match and returns the final scores {'X': ..., 'O': ...}, penalties included.
+    board = BitBoard(**dict_board_params)
+    playerX.piece, playerO.piece = 'X', 'O'
+    playerX.penalty = playerO.penalty = 0
+    player, advPlayer = playerX, playerO
+    passCount = 0
+    try:
+        await playerX.send(board_to_message(dict_board_params))
+        await playerO.send(board_to_message(dict_board_params))
+        await playerX.send("piece X")
+        await playerO.send("piece O")
+        while passCount < 2:
+            move = await receiveValidMoveMsg(player, board)
+            if move == 'abort':
+                await player.send("ok")  # para liberar o client do seu loop de ação
+                print(f"{label} aborted because {player.name} sent too many invalid moves.")
+                player.penalty = 100
+                break
+            await player.send("ok")
+            if move == 'pass':
+                passCount += 1
+                if passCount < 2:
+                    await advPlayer.send(f"{player.piece} pass")
+            else:
+                passCount = 0
+                rev.makeMove(board, player.piece, move[0], move[1])
+                await advPlayer.send(f"{player.piece} {move[0]} {move[1]}")
+            player, advPlayer = advPlayer, player
+    except ConnectionError:
+        for p in (playerX, playerO):
+            if not p.connected:
+                print(f"{label} aborted because {p.name} disconnected.")
+                p.penalty = 100
+
+    scores = rev.getScoreOfBoard(board)
+    scores = {'X': scores['X'] - playerX.penalty, 'O': scores['O'] - playerO.penalty}
+    scoreMsg = f"end X {scores['X']} O {scores['O']}"
+    for p in (playerX, playerO):
+        if p.connected:
+            try:
+                await p.send(scoreMsg)
+            except ConnectionError:
+                pass
+    return scores
+
+
+def roundRobinRounds(clients):
+    # The rounds of a round robin as lists of (playerX, playerO), by the circle method: the first client
+    # stays put and the others rotate. With an odd count, the client paired with None has a bye.
+    players = list(clients) + ([None] if len(clients) % 2 else [])
+    half = len(players) // 2
+    rounds = []
+    for r in range(len(players) - 1):
+        pairs = []
+        for i in range(half):
+            a, b = players[i], players[-1 - i]
+            if a is None or b is None:
+                continue
+            pairs.append((a, b) if (r + i) % 2 == 0 else (b, a))
+        rounds.append(pairs)
+        players.insert(1, players.pop())
+    return rounds
+
+
+def buchholz(client, byName):
+    # Swiss tie-break: the points of the opponents met.
+    return sum(byName[name].points for name in client.opponents)
+
+
+def _pairUp(players, budget):
+    # Pairs the list (best first) so that nobody meets an earlier opponent, or None if that is impossible or
+    # takes more than budget[0] steps of the backtracking search (the list is consumed as it goes).
+    if not players:
+        return []
+    first = players[0]
+    for i in range(1, len(players)):
+        budget[0] -= 1
+        if budget[0] < 0:
+            return None
+        if players[i].name not in first.opponents:
+            rest = _pairUp(players[1:i] + players[i + 1:], budget)
+            if rest is not None:
+                return [(first, players[i])] + rest
+    return None
+
+
+def pairWithoutRematches(players):
+    # Pairs the ranked list avoiding rematches. When that fails (or is too long to find), the lowest ranked
+    # pair is paired as it stands, rematch or not, and so on up the list until the rest can be paired.
+    for tail in range(0, len(players) + 1, 2):
+        head = players[:len(players) - tail]
+        pairs = _pairUp(head, [PAIRING_STEPS])
+        if pairs is not None:
+            rest = players[len(players) - tail:]
+            return pairs + list(zip(rest[::2], rest[1::2]))
+    return []
+
+
+def swissPairings(clients, rng):
+    # The pairs of the next Swiss round among the connected clients, ranked by points then tie-break (ties
+    # broken at random), and the client that gets the bye (None with an even count). The lowest ranked
+    # client that has not had a bye yet gets it. Rematches are only allowed when they cannot be avoided
+    # (see pairWithoutRematches).
+    byName = {c.name: c for c in clients}
+    players = [c for c in clients if c.connected]
+    rng.shuffle(players)
+    players.sort(key=lambda c: (-c.points, -buchholz(c, byName)))
+    bye = None
+    if len(players) % 2:
+        bye = next((c for c in reversed(players) if not c.bye), players[-1])
+        players.remove(bye)
+    pairs = pairWithoutRematches(players)
+    # X goes to the one who has played it less
+    return [(a, b) if a.whites <= b.whites else (b, a) for a, b in pairs], bye
+
+
+class Tournament:
+    def __init__(self, schedule='roundrobin', games=2, rounds=None, board_param=BOARD_PARAM, results=None,
+                 seed=0):
+        self.schedule = schedule
+        self.games = games
+        self.rounds = rounds
+        self.board_param = board_param
+        self.results = results  # path of a JSONL file getting one record per match
+        self.rng = random.Random(seed)
+        self.clients = []
+        self.started = False
+        self.joined = asyncio.Event()
+
+    async def handleClient(self, reader, writer):
+        # Connection callback: asks the name of the client and registers it for the tournament.
+        client = Client('-', reader, writer)
+        try:
+            await client.send("name?")
+            name = await client.receive() or 'player'
+        except ConnectionError:
+            await client.close()
+            return
+        if self.started:
+            try:
+                await client.send("disconnect")
+            except ConnectionError:
+                pass
+            finally:
+                await client.close()
+            print(f" - {name} arrived after the start and was sent away")
+            return
+        names = {c.name for c in self.clients}
+        while name in names:
+            name = name + '_'
+        client.name = name
+        self.clients.append(client)
+        print(f" - player {len(self.clients)} is {name}, from {writer.get_extra_info('peername')}")
+        self.joined.set()
+
+    async def waitForPlayers(self, players=None, wait=10.):
+        # Returns once 'players' clients have joined or, without a count, once at least two have and no
+        # other joined for 'wait' seconds.
+        while True:
+            try:
+                await asyncio.wait_for(self.joined.wait(), None if players else wait)
+                self.joined.clear()
+                if players and len(self.clients) >= players:
+                    break
+            except asyncio.TimeoutError:
+                if len(self.clients) >= 2:
+                    break
+        self.started = True
+
+    async def playPairing(self, a, b, label):
+        # The matches of a pairing, with alternating colours; a disconnected client loses the rest by forfeit.
+        for game in range(self.games):
+            playerX, playerO = (a, b) if game % 2 == 0 else (b, a)
+            matchLabel = f"{label} {playerX.name}-{playerO.name} #{game + 1}"
+            if playerX.connected and playerO.connected:
+                scores = await serve_match(playerX, playerO, self.board_param, matchLabel)
+            else:
+                scores = {'X': 0 if not playerX.connected else 1, 'O': 0 if not playerO.connected else 1}
+            score = 1. if scores['X'] > scores['O'] else .5 if scores['X'] == scores['O'] else 0.
+            playerX.record(playerO, score)
+            playerO.record(playerX, 1 - score)
+            playerX.whites += 1
+            playerO.whites -= 1
+            print(f"{matchLabel}: X {scores['X']} O {scores['O']}")
+            if self.results:
+                with open(self.results, 'a') as out:
+                    out.write(json.dumps({'round': label, 'X': playerX.name, 'O': playerO.name,
+                                          'scores': scores, 'result': score}) + '\n')
+
+    async def playRound(self, label, pairs, bye=None):
+        if bye is not None:
+            bye.points += self.games  # a bye is worth a won pairing
+            bye.bye = True
+            print(f"{label}: bye for {bye.name}")
+        await asyncio.gather(*(self.playPairing(a, b, label) for a, b in pairs))
+
+    async def play(self):
+        if self.schedule == 'roundrobin':
+            for r, pairs in enumerate(roundRobinRounds(self.clients), 1):
+                print(f"ROUND {r}: " + ', '.join(f"{a.name}-{b.name}" for a, b in pairs))
+                await self.playRound(f"R{r}", pairs)
+        else:
+            rounds = self.rounds or math.ceil(math.log2(len(self.clients))) + 1
+            for r in range(1, rounds + 1):
+                pairs, bye = swissPairings(self.clients, self.rng)
+                if not pairs:
+                    break
+                print(f"ROUND {r}/{rounds}: " + ', '.join(f"{a.name}-{b.name}" for a, b in pairs))
+                await self.playRound(f"R{r}", pairs, bye)
+
+    def standings(self):
+        byName = {c.name: c for c in self.clients}
+        return sorted(self.clients, key=lambda c: (-c.points, -buchholz(c, byName), c.name))
+
+    def printStandings(self):
+        byName = {c.name: c for c in self.clients}
+        print(" -- STANDINGS ------------------------------")
+        for rank, c in enumerate(self.standings(), 1):
+            gone = '' if c.connected else ' (disconnected)'
+            print(f"| {rank:>3}. {c.name:<20} {c.points:5.1f} points  +{c.wins} ={c.draws} -{c.losses}  "
+                  f"buchholz {buchholz(c, byName):.1f}{gone}")
+        print(" -------------------------------------------")
+
+    async def close(self):
+        for client in self.clients:
+            if client.connected:
+                try:
+                    await client.send("disconnect")
+                except ConnectionError:
+                    pass
+        await asyncio.sleep(1)
+        for client in self.clients:
+            await client.close()
+
+
+async def server_program(host=None, port=PORT, players=None, wait=10., **settings):
+    tournament = Tournament(**settings)
+    server = await asyncio.start_server(tournament.handleClient, host or socket.gethostname(), port)
+    print("STARTING REVERSI TOURNAMENT SERVER")
+    print(f"- waiting for {players or 'the'} players (clients)")
+    async with server:
+        await tournament.waitForPlayers(players, wait)
+        print(f"TOURNAMENT ({tournament.schedule}) WITH {len(tournament.clients)} PLAYERS")
+        await tournament.play()
+        print("ALL MATCHES ENDED")
+        tournament.printStandings()
+        await tournament.close()
+    return tournament
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Reversi tournament server for any number of clients')
+    parser.add_argument('--host', default=None, help='address to listen on (default: this host name, as the clients)')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--schedule', choices=['roundrobin', 'swiss'], default='roundrobin')
+    parser.add_argument('--rounds', type=int, default=None, help='Swiss rounds (default: log2(players) + 1)')
+    parser.add_argument('--games', type=int, default=2, help='matches per pairing, with alternating colours')
+    parser.add_argument('--players', type=int, default=None, help='start once this many clients have joined')
+    parser.add_argument('--wait', type=float, default=10.,
+                        help='without --players, start once no client joined for this many seconds')
+    parser.add_argument('--size', type=int, nargs=2, default=[8, 8], metavar=('X', 'Y'))
+    parser.add_argument('--stones', type=int, nargs='*', default=[1, 6, 6, 6],
+                        help='stone coordinates as x1 y1 x2 y2 ...')
+    parser.add_argument('--results', metavar='FILE', help='append one JSON record per match to FILE')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the Swiss tie breaks')
+    args = parser.parse_args()
+    board_param = dict(sizeX=args.size[0], sizeY=args.size[1],
+                       stones=[list(s) for s in zip(args.stones[::2], args.stones[1::2])])
+    asyncio.run(server_program(args.host, args.port, args.players, args.wait, schedule=args.schedule,
+                               games=args.games, rounds=args.rounds, board_param=board_param,
+                               results=args.results, seed=args.seed))
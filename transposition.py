@@ -0,0 +1,85 @@
+########################
+# Transposition table for the MCTS tree.
+# Positions are keyed by their Zobrist key (BitBoard.key: discs, side to move and passes). Nodes that
+# reach the same position by different move orders share one NodeStats, so the visit and result counts
+# form a DAG. Only the statistics are shared: every path still has its own node, with its own children,
+# untried moves and proven result, so the tree is as large as without the table.
+# The table is bounded: each key maps to a bucket of two slots, and when both are taken by other
+# positions the new entry replaces the less valuable one: first entries left from an earlier search,
+# then the one with fewer visits, then the deeper one. This bounds the table, not the memory: an evicted
+# NodeStats lives on in the nodes that use it.
+########################
+
+from collections import defaultdict
+
+
+class NodeStats:
+    __slots__ = ('key', 'depth', 'generation', 'visits', 'results')
+
+    def __init__(self, key=None, depth=0, generation=0):
+        self.key = key
+        self.depth = depth
+        self.generation = generation
+        self.visits = 0
+        self.results = defaultdict(int)
+        self.results[1] = 0
+        self.results[-1] = 0
+
+
+class TranspositionTable:
+    def __init__(self, capacity=1 << 16):
+        # capacity is rounded up to a power of two so a key is mapped to its bucket with a mask
+        self.capacity = 1 << max(1, (capacity - 1).bit_length())
+        self.slots = [None] * self.capacity
+        self.generation = 0
+        self.hits = 0
+        self.stores = 0
+
+    def newSearch(self):
+        # Entries stored before this call become the first candidates for replacement.
+        self.generation += 1
+
+    def _bucket(self, key):
+        first = key & (self.capacity - 1) & ~1
+        return first, first + 1
+
+    def lookup(self, key):
+        for i in self._bucket(key):
+            entry = self.slots[i]
+            if entry is not None and entry.key == key:
+                self.hits += 1
+                return entry
+        return None
+
+    def store(self, stats):
+        # An evicted entry is only forgotten by the table: the nodes using it keep their statistics.
+        slots = self.slots
+        first, second = self._bucket(stats.key)
+        for i in (first, second):
+            if slots[i] is None or slots[i].key == stats.key:
+                slots[i] = stats
+                self.stores += 1
+                return
+        generation = self.generation
+        victim = min((first, second),
+                     key=lambda i: (slots[i].generation == generation, slots[i].visits, -slots[i].depth))
+        slots[victim] = stats
+        self.stores += 1
+
+    def getOrCreate(self, key, depth):
+        # Statistics shared by every node of this position, created and stored on first sight.
+        stats = self.lookup(key)
+        if stats is None:
+            stats = NodeStats(key, depth, self.generation)
+            self.store(stats)
+        else:
+            stats.generation = self.generation
+        return stats
+
+    def clear(self):
+        self.slots = [None] * self.capacity
+        self.hits = 0
+        self.stores = 0
+
+    def __len__(self):
+        return sum(entry is not None for entry in self.slots)